@@ -3,6 +3,11 @@
 
 import functools
 
+try:
+	import numpy as np
+except ImportError:		# only the vectorized decorator needs it
+	np = None
+
 def decorator(divisor):
 	@functools.wraps(divisor)
 	def wrapper(*args, **kwargs):
@@ -18,3 +23,60 @@ def custom_divisor(a,b):
 
 print(custom_divisor(5,3))
 print(custom_divisor(5,0))
+
+
+# same guard for arrays of millions of pairs: instead of calling the divisor
+# once per pair, call it once on whole arrays. Zero denominators are replaced
+# by 1 before dividing, and their results by `fill_value` after.
+# Returns (result, mask) where mask is True where the denominator was zero.
+# Two scalars still go through `decorator` above.
+
+def vectorized(_divisor=None, *, fill_value=float("nan")):
+	if np is None:
+		raise ImportError("vectorized needs numpy: pip install numpy")
+
+	def decorator_vectorized(divisor):
+		scalar = decorator(divisor)
+
+		@functools.wraps(divisor)
+		def wrapper(a, b):
+			if np.ndim(a) == 0 and np.ndim(b) == 0:
+				return scalar(a, b)
+			a, b = np.asarray(a), np.asarray(b)
+			mask = b == 0
+			result = divisor(a, np.where(mask, 1, b))
+			return np.where(mask, fill_value, result), mask
+		wrapper.scalar = scalar
+		return wrapper
+
+	if _divisor is None:
+		return decorator_vectorized
+	else:
+		return decorator_vectorized(_divisor)
+
+
+if __name__ == "__main__":
+	import time
+
+	@vectorized(fill_value=0.0)
+	def vector_divisor(a, b):
+		return a / b
+
+	print(vector_divisor(5, 0))
+	print(vector_divisor([5, 6, 7], [3, 0, 2]))
+
+	rng = np.random.default_rng(0)
+	a = rng.integers(-100, 100, 1_000_000)
+	b = rng.integers(-3, 4, 1_000_000)		# about one in seven is zero
+
+	start = time.perf_counter()
+	looped = [custom_divisor(x, y) for x, y in zip(a.tolist(), b.tolist())]
+	loop_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	result, mask = vector_divisor(a, b)
+	vector_time = time.perf_counter() - start
+
+	assert mask.sum() == looped.count("Denominator is Zero")
+	print(f"per element loop {loop_time * 1e3:>8.1f} ms")
+	print(f"vectorized       {vector_time * 1e3:>8.1f} ms ({loop_time / vector_time:.0f}x)")
@@ -0,0 +1,136 @@
+'''
+Count calls without losing counts under threads.
+
+count_calls and CountCalls do `num_calls += 1` on one shared attribute and
+print on every call: under threads that loses increments and makes every
+call wait for stdout. Here every thread increments its own counter, nobody
+else ever writes to it, and `num_calls` adds them all up when it is read.
+`reset` doesn't write to the counters either: it records where each one
+stands, and `num_calls` counts from there.
+
+CountCalls is also a descriptor, so it works on methods: `instance.method`
+gets bound to the instance like a plain function would.
+'''
+
+import threading
+import types
+
+
+class CountCalls:
+	__slots__ = ("__wrapped__", "_local", "_cells", "_bases", "_lock")
+
+	def __init__(self, func):
+		self.__wrapped__ = func
+		self._local = threading.local()		# .cell: this thread's [count]
+		self._cells = []					# the cells of every thread so far
+		self._bases = []					# each cell's count at the last reset
+		self._lock = threading.Lock()		# registering a new thread, reset
+
+	def __call__(self, *args, **kwargs):
+		try:
+			self._local.cell[0] += 1
+		except AttributeError:		# first call in this thread
+			cell = self._local.cell = [1]
+			with self._lock:
+				self._cells.append(cell)
+				self._bases.append(0)
+		return self.__wrapped__(*args, **kwargs)
+
+	def __get__(self, instance, owner=None):
+		if instance is None:
+			return self
+		return types.MethodType(self, instance)
+
+	@property
+	def num_calls(self):
+		# cells of finished threads are kept, their calls still count
+		with self._lock:
+			return sum(cell[0] - base for cell, base in zip(self._cells, self._bases))
+
+	def reset(self):
+		# only the owning thread writes to a cell: a `cell[0] = 0` from here
+		# could be undone by an increment in flight, so remember the count
+		with self._lock:
+			self._bases = [cell[0] for cell in self._cells]
+
+	# a __slots__ class has no __dict__ for functools.update_wrapper to fill,
+	# so __name__, __qualname__, ... are read from the wrapped function
+	def __getattr__(self, name):
+		if name == "__wrapped__":		# not set yet, e.g. while unpickling
+			raise AttributeError(name)
+		return getattr(self.__wrapped__, name)
+
+	@property
+	def __doc__(self):
+		return self.__wrapped__.__doc__
+
+	def __repr__(self):
+		return f"<CountCalls {self.__qualname__}: {self.num_calls} calls>"
+
+
+count_calls = CountCalls
+
+
+if __name__ == "__main__":
+	import functools
+	import time
+	from concurrent.futures import ThreadPoolExecutor
+
+	@count_calls
+	def SayHi(name):
+		return f"Hi {name}"
+
+	class Greeter:
+		@count_calls
+		def greet(self, name):
+			return f"{self.__class__.__name__} says hi to {name}"
+
+	SayHi("HP")
+	SayHi("HP")
+	print(Greeter().greet("HP"))
+	print(SayHi, Greeter.greet)
+
+	# the original counters, without the print
+	def count_calls_racy(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			wrapper.num_calls += 1
+			return func(*args, **kwargs)
+		wrapper.num_calls = 0
+		return wrapper
+
+	def count_calls_locked(func):
+		lock = threading.Lock()
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with lock:
+				wrapper.num_calls += 1
+			return func(*args, **kwargs)
+		wrapper.num_calls = 0
+		return wrapper
+
+	def noop():
+		pass
+
+	calls_per_thread = 200_000
+
+	def run(func, threads):
+		def loop(_):
+			for _ in range(calls_per_thread):
+				func()
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=threads) as executor:
+			list(executor.map(loop, range(threads)))
+		return time.perf_counter() - start
+
+	print(f"{'counter':<16}{'threads':>8}{'ns per call':>14}{'counted':>12}{'expected':>12}")
+	for threads in (1, 8):
+		base = run(noop, threads)
+		for name, decorator in (("racy", count_calls_racy), ("locked", count_calls_locked),
+								("per-thread", count_calls)):
+			func = decorator(noop)
+			elapsed = run(func, threads)
+			overhead = (elapsed - base) / (threads * calls_per_thread) * 1e9
+			print(f"{name:<16}{threads:>8}{overhead:>14.0f}{func.num_calls:>12}"
+				f"{threads * calls_per_thread:>12}")
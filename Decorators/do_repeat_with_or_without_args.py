@@ -1,4 +1,10 @@
 import functools
+import gc
+import json
+import math
+import statistics
+import time
+from collections import namedtuple
 
 def repeat(_func=None, *, num_times=2):
     def decorator_repeat(func):
@@ -14,13 +20,120 @@ def repeat(_func=None, *, num_times=2):
     else:
         return decorator_repeat(_func)
 
-@repeat(num_times=5)
-def printy(name):
-	print(f'Hello {name}')
 
-@repeat
-def printo(name):
-	print(f'Hi {name}')
+# ---------------- benchmark ----------------
+# `repeat` keeps only the last value. `benchmark` runs the function the
+# same way but times it: a few warmup calls, then `runs` timed runs of
+# `loops` calls each with the garbage collector off. `loops` is calibrated
+# so one run lasts at least `min_run_time` seconds, which keeps the timer
+# resolution out of the numbers even for very fast functions.
 
-printy("HP")		# func with arg in decorator
-printo("HP")		# func without arg in decorator
+BenchmarkResult = namedtuple(
+    "BenchmarkResult",
+    ["name", "runs", "loops", "mean", "stdev", "min", "p50", "p90", "p99", "value"],
+)
+BenchmarkResult.__doc__ = "Seconds per call, statistics over the runs."
+
+
+def _percentile(ordered, q):
+    # linear interpolation between the closest ranks
+    position = (len(ordered) - 1) * q
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _time_loops(func, args, kwargs, loops):
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(loops):
+        func(*args, **kwargs)
+    return perf_counter() - start
+
+
+def _calibrate(func, args, kwargs, min_run_time):
+    loops = 1
+    while _time_loops(func, args, kwargs, loops) < min_run_time:
+        loops *= 2
+    return loops
+
+
+def _append_history(path, result):
+    record = result._asdict()
+    record.pop("value")
+    record["timestamp"] = time.time()
+    with open(path, "a") as f:		# one JSON object per line
+        f.write(json.dumps(record) + "\n")
+
+
+def benchmark(_func=None, *, runs=20, warmup=3, loops=None, min_run_time=0.01, history=None):
+    def decorator_benchmark(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper_benchmark(*args, **kwargs):
+            for _ in range(warmup):
+                value = func(*args, **kwargs)
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                n = loops or _calibrate(func, args, kwargs, min_run_time)
+                times = [_time_loops(func, args, kwargs, n) / n for _ in range(runs)]
+                value = func(*args, **kwargs)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+
+            ordered = sorted(times)
+            result = BenchmarkResult(
+                name, runs, n,
+                statistics.mean(times),
+                statistics.stdev(times) if runs > 1 else 0.0,
+                ordered[0],
+                _percentile(ordered, 0.50),
+                _percentile(ordered, 0.90),
+                _percentile(ordered, 0.99),
+                value,
+            )
+            if history:
+                _append_history(history, result)
+            return result
+        return wrapper_benchmark
+
+    if _func is None:
+        return decorator_benchmark
+    else:
+        return decorator_benchmark(_func)
+
+
+def print_result(result):
+    us = {field: getattr(result, field) * 1e6 for field in ("mean", "stdev", "min", "p50", "p99")}
+    print(f"{result.name}: {result.runs} runs x {result.loops} loops, "
+          f"mean {us['mean']:.3f} us +- {us['stdev']:.3f}, min {us['min']:.3f}, "
+          f"p50 {us['p50']:.3f}, p99 {us['p99']:.3f}")
+
+
+if __name__ == "__main__":
+    @repeat(num_times=5)
+    def printy(name):
+        print(f'Hello {name}')
+
+    @repeat
+    def printo(name):
+        print(f'Hi {name}')
+
+    printy("HP")		# func with arg in decorator
+    printo("HP")		# func without arg in decorator
+
+    @benchmark
+    def square_sum(n):
+        return sum(i * i for i in range(n))
+
+    @benchmark(runs=10, history="benchmark_history.jsonl")
+    def sorted_copy(items):
+        return sorted(items)
+
+    print_result(square_sum(100))
+    result = sorted_copy(list(range(1000, 0, -1)))
+    print_result(result)
+    print(result.value[:5])
@@ -0,0 +1,198 @@
+'''
+Instrument every public method of a class at once.
+
+Putting @timer on a class only times the construction (the call to the
+class). @instrument wraps each public method, classmethod, staticmethod and
+property of the class instead: every call is counted and on average one
+call in `sample_every` is timed into a histogram (see timer.Histogram),
+which keeps the overhead low enough for hot methods.
+
+Instrumentation can be switched off and on at runtime. Switching it off puts
+the original functions back on the class, so it costs nothing while off.
+'''
+
+import functools
+import inspect
+import time
+from random import randrange
+
+from timer import Histogram
+from wrapper_factory import make_wrapper
+
+_INSTRUMENT_BODY = """
+_stats.calls += 1
+_stats.countdown -= 1
+if _stats.countdown:
+	return {call}
+_stats.countdown = _randrange(1, _gap)
+_start = _perf_counter_ns()
+try:
+	return {call}
+finally:
+	_record(_perf_counter_ns() - _start)
+"""
+
+
+class MethodStats:
+	__slots__ = ("calls", "countdown", "histogram")
+
+	def __init__(self):
+		self.calls = 0
+		self.countdown = 1		# calls left until the next timed one
+		self.histogram = Histogram()
+
+
+class ClassInstrumentation:
+	def __init__(self, cls, sample_every):
+		self.cls = cls
+		self.sample_every = sample_every
+		self.stats = {}			# method name -> MethodStats
+		self.originals = {}		# attribute name -> original class attribute
+		self.wrapped = {}		# attribute name -> instrumented attribute
+		self.enabled = False
+
+		for name, attr in list(vars(cls).items()):
+			if name.startswith("_"):
+				continue
+			instrumented = self._instrument(name, attr)
+			if instrumented is not None:
+				self.originals[name] = attr
+				self.wrapped[name] = instrumented
+
+	def _wrap(self, name, func):
+		stats = self.stats[name] = MethodStats()
+		record = stats.histogram.record
+		sample_every = self.sample_every
+		perf_counter_ns = time.perf_counter_ns
+
+		def generic(func):
+			@functools.wraps(func)
+			def wrapper_instrumented(*args, **kwargs):
+				stats.calls += 1
+				stats.countdown -= 1
+				if stats.countdown:
+					return func(*args, **kwargs)
+				# random gaps (mean sample_every) so periodic call patterns
+				# don't bias which calls get timed
+				stats.countdown = randrange(1, 2 * sample_every)
+				start = perf_counter_ns()
+				try:
+					return func(*args, **kwargs)
+				finally:
+					record(perf_counter_ns() - start)
+			return wrapper_instrumented
+
+		# same as `generic`, with func's own signature: no *args/**kwargs packing
+		return make_wrapper(
+			func,
+			_INSTRUMENT_BODY,
+			{"_stats": stats, "_record": record, "_randrange": randrange,
+				"_gap": 2 * sample_every, "_perf_counter_ns": perf_counter_ns},
+			fallback=generic,
+		)
+
+	def _instrument(self, name, attr):
+		if isinstance(attr, staticmethod):
+			return staticmethod(self._wrap(name, attr.__func__))
+		if isinstance(attr, classmethod):
+			return classmethod(self._wrap(name, attr.__func__))
+		if isinstance(attr, property):
+			return property(
+				attr.fget and self._wrap(name, attr.fget),
+				attr.fset and self._wrap(f"{name}.setter", attr.fset),
+				attr.fdel and self._wrap(f"{name}.deleter", attr.fdel),
+				attr.__doc__,
+			)
+		if inspect.isfunction(attr):		# not nested classes or other callables
+			return self._wrap(name, attr)
+		return None
+
+	def enable(self):
+		for name, attr in self.wrapped.items():
+			setattr(self.cls, name, attr)
+		self.enabled = True
+
+	def disable(self):
+		for name, attr in self.originals.items():
+			setattr(self.cls, name, attr)
+		self.enabled = False
+
+	def reset(self):
+		# the wrappers hold on to their stats, rebuild them with fresh ones
+		enabled = self.enabled
+		self.disable()
+		self.wrapped = {
+			name: self._instrument(name, attr) for name, attr in self.originals.items()
+		}
+		if enabled:
+			self.enable()
+
+	def report(self):
+		result = {}
+		for name, stats in self.stats.items():
+			summary = stats.histogram.summary()
+			summary["sampled"] = summary.pop("calls")
+			summary["calls"] = stats.calls
+			# estimated total time, from the sampled mean
+			summary["total_ns"] = summary["mean_ns"] * stats.calls
+			result[name] = summary
+		return result
+
+	def print_report(self):
+		print(f"{self.cls.__qualname__} (1 in {self.sample_every} calls timed)")
+		print(f"{'method':<24}{'calls':>10}{'total':>12}{'p50':>12}{'p99':>12}{'max':>12}")
+		ordered = sorted(self.report().items(), key=lambda item: -item[1]["total_ns"])
+		for name, s in ordered:
+			print(
+				f"{name:<24}{s['calls']:>10}{s['total_ns'] / 1e6:>10.2f}ms"
+				+ "".join(f"{s[key] / 1000:>10.1f}us" for key in ("p50_ns", "p99_ns", "max_ns"))
+			)
+
+
+def instrument(_cls=None, *, sample_every=1, enabled=True):
+	def decorator_instrument(cls):
+		cls.__instrumentation__ = ClassInstrumentation(cls, sample_every)
+		if enabled:
+			cls.__instrumentation__.enable()
+		return cls
+
+	if _cls is None:
+		return decorator_instrument
+	else:
+		return decorator_instrument(_cls)
+
+
+if __name__ == "__main__":
+	@instrument(sample_every=10)
+	class TimeWaster:
+		def __init__(self, max_num):
+			self.max_num = max_num
+
+		def waste_time(self, num_times):
+			for _ in range(num_times):
+				sum([i**2 for i in range(self.max_num)])
+
+		@property
+		def double(self):
+			return self.max_num * 2
+
+		@classmethod
+		def small(cls):
+			return cls(10)
+
+		@staticmethod
+		def describe():
+			return "wastes time"
+
+	t = TimeWaster(1000)
+	for _ in range(100):
+		t.waste_time(10)
+		t.double
+		TimeWaster.small().waste_time(1)
+		TimeWaster.describe()
+	TimeWaster.__instrumentation__.print_report()
+
+	# switched off the class has its original functions back
+	TimeWaster.__instrumentation__.disable()
+	t.waste_time(10)
+	print(TimeWaster.__instrumentation__.report()["waste_time"]["calls"])
@@ -0,0 +1,148 @@
+'''
+Memoize results on disk so they survive process restarts.
+
+Results are pickled into a sqlite database, with an in-memory LRU
+(ttl_cache) in front so repeated calls never touch the disk. Every stored
+result is tagged with a hash of the function's source code: when the code
+changes the old results are dropped instead of being served stale.
+
+Arguments are pickled to build the key, so they must be picklable and
+their pickle must be stable (numbers, strings, tuples, ...).
+'''
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+
+from ttl_cache import ttl_cache
+
+
+def _source_hash(func):
+	try:
+		source = inspect.getsource(func)
+	except (OSError, TypeError):		# no source (builtins, REPL), use the bytecode
+		source = func.__code__.co_code
+	if isinstance(source, str):
+		source = source.encode()
+	return hashlib.sha256(source).hexdigest()
+
+
+class DiskStore:
+	"""
+		Pickled results of one version of a function in a sqlite table. Safe
+		to share between threads, and between processes thanks to WAL mode.
+	"""
+
+	def __init__(self, path, name, version):
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.conn.execute(
+			"CREATE TABLE IF NOT EXISTS results "
+			"(func TEXT, version TEXT, key BLOB, value BLOB, PRIMARY KEY (func, key))"
+		)
+		self.name = name
+		self.version = version
+		with self.lock:
+			# the code changed since these were stored
+			self.conn.execute(
+				"DELETE FROM results WHERE func = ? AND version != ?", (name, version)
+			)
+
+	def get(self, key):
+		with self.lock:
+			row = self.conn.execute(
+				"SELECT value FROM results WHERE func = ? AND key = ?", (self.name, key)
+			).fetchone()
+		if row is None:
+			return False, None
+		return True, pickle.loads(row[0])
+
+	def put(self, key, value):
+		blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+		with self.lock:
+			self.conn.execute(
+				"INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+				(self.name, self.version, key, blob),
+			)
+
+	def clear(self):
+		with self.lock:
+			self.conn.execute("DELETE FROM results WHERE func = ?", (self.name,))
+
+	def __len__(self):
+		with self.lock:
+			return self.conn.execute(
+				"SELECT COUNT(*) FROM results WHERE func = ?", (self.name,)
+			).fetchone()[0]
+
+
+def persistent_cache(_func=None, *, path="memoize.sqlite3", maxsize=128):
+	def decorator_persistent_cache(func):
+		name = f"{func.__module__}.{func.__qualname__}"
+		store = DiskStore(path, name, _source_hash(func))
+
+		@ttl_cache(maxsize=maxsize)
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			# only runs on a miss of the in-memory cache
+			key = pickle.dumps((args, sorted(kwargs.items())), pickle.HIGHEST_PROTOCOL)
+			found, value = store.get(key)
+			if found:
+				return value
+			value = func(*args, **kwargs)
+			store.put(key, value)
+			return value
+
+		memory_clear = wrapper.cache_clear
+
+		def cache_clear():
+			memory_clear()
+			store.clear()
+
+		wrapper.cache_clear = cache_clear
+		wrapper.store = store
+		return wrapper
+
+	if _func is None:
+		return decorator_persistent_cache
+	else:
+		return decorator_persistent_cache(_func)
+
+
+if __name__ == "__main__":
+	import time
+
+	path = "fibonacci_cache.sqlite3"
+
+	def slow_fibonacci(num):
+		# deliberately not memoized in memory, stands in for expensive work
+		if num < 2:
+			return num
+		return slow_fibonacci(num-1) + slow_fibonacci(num-2)
+
+	def timed(fib, nums):
+		start = time.perf_counter()
+		for num in nums:
+			fib(num)
+		return (time.perf_counter() - start) / len(nums) * 1e6
+
+	for suffix in ("", "-wal", "-shm"):
+		if os.path.exists(path + suffix):
+			os.remove(path + suffix)
+
+	nums = list(range(15, 25))
+
+	fib = persistent_cache(path=path)(slow_fibonacci)
+	print(f"cold start        {timed(fib, nums):>10.1f} us per call")
+
+	# a new process would build a new decorator: empty memory, same disk
+	fib = persistent_cache(path=path)(slow_fibonacci)
+	print(f"warm start, disk  {timed(fib, nums):>10.1f} us per call")
+	print(f"warm, in memory   {timed(fib, nums):>10.1f} us per call")
+	print(f"{len(fib.store)} results on disk, {fib.cache_info()}")
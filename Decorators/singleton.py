@@ -1,14 +1,62 @@
 import functools
+import threading
+import weakref
+
+# separates positional from keyword arguments in a multiton key, so that
+# f(1, ("a", 2)) and f(1, a=2) don't get the same instance
+_KWD_MARK = object()
+
+
+def _make_key(args, kwargs):
+	return args + (_KWD_MARK,) + tuple(sorted(kwargs.items()))
+
 
 def singleton(cls):
+	lock = threading.Lock()
+
 	@functools.wraps(cls)
 	def wrapper(*args, **kwargs):
-		if not wrapper.instance:
-			wrapper.instance = cls(*args, **kwargs)
+		# double-checked: the lock is only taken until the instance exists
+		if wrapper.instance is None:
+			with lock:
+				if wrapper.instance is None:
+					wrapper.instance = cls(*args, **kwargs)
 		return wrapper.instance
 	wrapper.instance = None
 	return wrapper
 
+
+def multiton(_cls=None, *, weak=False):
+	'''
+		One instance per tuple of constructor arguments, e.g. one client per
+		config. With weak=True an instance nobody references any more is
+		dropped and built again on the next call.
+	'''
+	def decorator_multiton(cls):
+		instances = weakref.WeakValueDictionary() if weak else {}
+		lock = threading.Lock()
+
+		@functools.wraps(cls)
+		def wrapper(*args, **kwargs):
+			key = _make_key(args, kwargs) if kwargs else args
+			instance = instances.get(key)
+			if instance is None:
+				# one lock for all keys: construction is rare, and this way
+				# two threads never build the same instance
+				with lock:
+					instance = instances.get(key)
+					if instance is None:
+						instance = instances[key] = cls(*args, **kwargs)
+			return instance
+		wrapper.instances = instances
+		return wrapper
+
+	if _cls is None:
+		return decorator_multiton
+	else:
+		return decorator_multiton(_cls)
+
+
 @singleton
 class TheOne:
 	pass
@@ -22,3 +70,32 @@ print(id(firstObj))
 print(id(secObj))
 
 print(firstObj is secObj)
+
+# --------- under threads, and per config -------------
+
+if __name__ == "__main__":
+	import time
+	from concurrent.futures import ThreadPoolExecutor
+
+	built = []
+
+	@singleton
+	class Pool:
+		def __init__(self):
+			time.sleep(0.1)		# slow enough for every thread to race
+			built.append(self)
+
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		pools = list(executor.map(lambda _: Pool(), range(8)))
+	print(f"{len(built)} pool built for {len(set(map(id, pools)))} distinct instance(s)")
+
+	@multiton(weak=True)
+	class Client:
+		def __init__(self, host, port=5672):
+			self.host, self.port = host, port
+
+	a = Client("localhost")
+	print(a is Client("localhost"), a is Client("localhost", port=5673))
+	print(len(Client.instances))		# the port=5673 client was freed already
+	del a
+	print(len(Client.instances))
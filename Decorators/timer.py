@@ -1,15 +1,236 @@
+import atexit
 import functools
+import threading
 import time
 
-def timer(func):
-    @functools.wraps(func)
-    def wrapper_decorator(*args, **kwargs):
-        start_time = time.time()
-        value = func(*args, **kwargs)
-        finish_time = time.time()
-        print(f"Finished in {(finish_time-start_time):.7f} sec")
+from wrapper_factory import make_wrapper
+
+
+# ---------------- aggregating mode ----------------
+# `@timer(aggregate=True)` does not print anything per call. Every call's
+# duration (perf_counter_ns) goes into a log-bucketed histogram kept per
+# function, and `report()` summarizes them on demand and at exit.
+
+# 2**SUB_BITS buckets per power of two, i.e. at most ~6% relative error
+SUB_BITS = 4
+_SUB_COUNT = 1 << SUB_BITS
+_LINEAR = 1 << (SUB_BITS + 1)
+
+
+def _bucket(value):
+    if value < _LINEAR:
         return value
-    return wrapper_decorator
+    shift = value.bit_length() - (SUB_BITS + 1)
+    return ((shift + 1) << SUB_BITS) + (value >> shift) - _SUB_COUNT
+
+
+def _bucket_upper(index):
+    if index < _LINEAR:
+        return index
+    shift = (index >> SUB_BITS) - 1
+    top = (index & (_SUB_COUNT - 1)) + _SUB_COUNT
+    return ((top + 1) << shift) - 1
+
+
+# bucket of the largest perf_counter_ns difference there can be
+_BUCKETS = _bucket((1 << 64) - 1) + 1
+
+
+class _Shard:
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS    # bucket index -> samples
+        self.total = 0
+        self.max = 0
+
+
+class Histogram:
+    """
+        HDR style histogram: bucket width grows with the value, so memory stays
+        small whatever the range and every percentile is within ~6%.
+
+        Like count_calls_threadsafe.CountCalls, every thread records into its
+        own shard without a lock, and the shards are merged when read.
+    """
+
+    def __init__(self, report_at_exit=True):
+        self.report_at_exit = report_at_exit
+        self._local = threading.local()     # .shard: this thread's _Shard
+        self._shards = []                   # the shards of every thread so far
+        self._lock = threading.Lock()       # only for registering a new thread
+
+    def record(self, value):
+        try:
+            shard = self._local.shard
+        except AttributeError:  # first sample in this thread
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        # _bucket(value), inlined: this runs on every timed call
+        if value < _LINEAR:
+            index = value
+        else:
+            shift = value.bit_length() - (SUB_BITS + 1)
+            index = ((shift + 1) << SUB_BITS) + (value >> shift) - _SUB_COUNT
+        shard.counts[index] += 1
+        shard.total += value
+        if value > shard.max:
+            shard.max = value
+
+    def _merged(self):
+        # shards of finished threads are kept, their samples still count
+        counts = [0] * _BUCKETS
+        total = maximum = 0
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for index, n in enumerate(shard.counts):
+                if n:
+                    counts[index] += n
+            total += shard.total
+            maximum = max(maximum, shard.max)
+        return counts, total, maximum
+
+    @property
+    def count(self):
+        with self._lock:
+            return sum(sum(shard.counts) for shard in self._shards)
+
+    def percentile(self, q):
+        counts, _, maximum = self._merged()
+        return self._percentile(counts, maximum, q)
+
+    @staticmethod
+    def _percentile(counts, maximum, q):
+        target = q * sum(counts)
+        seen = 0
+        for index, n in enumerate(counts):
+            if not n:
+                continue
+            seen += n
+            if seen >= target:
+                return min(_bucket_upper(index), maximum)
+        return 0
+
+    def summary(self):
+        counts, total, maximum = self._merged()
+        count = sum(counts)
+        return {
+            "calls": count,
+            "mean_ns": total / count if count else 0,
+            "p50_ns": self._percentile(counts, maximum, 0.50),
+            "p90_ns": self._percentile(counts, maximum, 0.90),
+            "p99_ns": self._percentile(counts, maximum, 0.99),
+            "max_ns": maximum,
+        }
+
+
+# function name -> Histogram
+HISTOGRAMS = {}
+
+# switch recording off and the wrapper costs one list lookup per call
+_enabled = [True]
+
+
+def enable():
+    _enabled[0] = True
+
+
+def disable():
+    _enabled[0] = False
+
+
+def report(at_exit=False):
+    """Summary of every function with calls, or only of those reported at exit."""
+    return {
+        name: hist.summary() for name, hist in HISTOGRAMS.items()
+        if hist.count and (hist.report_at_exit or not at_exit)
+    }
+
+
+def print_report(at_exit=False):
+    stats = report(at_exit)
+    if not stats:
+        return
+    print(f"{'function':<40}{'calls':>10}{'p50':>12}{'p90':>12}{'p99':>12}{'max':>12}")
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["calls"] * item[1]["mean_ns"]):
+        print(
+            f"{name:<40}{s['calls']:>10}" + "".join(
+                f"{s[key] / 1000:>10.1f}us" for key in ("p50_ns", "p90_ns", "p99_ns", "max_ns")
+            )
+        )
+
+
+_report_registered = []
+
+_AGGREGATE_BODY = """
+if not _enabled[0]:
+    return {call}
+_start = _perf_counter_ns()
+try:
+    return {call}
+finally:
+    _record(_perf_counter_ns() - _start)
+"""
+
+
+def _aggregate(func, report_at_exit):
+    name = f"{func.__module__}.{func.__qualname__}"
+    hist = HISTOGRAMS.get(name)
+    if hist is None:
+        hist = HISTOGRAMS[name] = Histogram(report_at_exit)
+    else:       # decorated again under the same name, shares the histogram
+        hist.report_at_exit |= report_at_exit
+    record = hist.record
+    perf_counter_ns = time.perf_counter_ns
+    enabled = _enabled
+
+    if report_at_exit and not _report_registered:
+        atexit.register(print_report, at_exit=True)
+        _report_registered.append(True)
+
+    def generic(func):
+        @functools.wraps(func)
+        def wrapper_aggregate(*args, **kwargs):
+            if not enabled[0]:
+                return func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(perf_counter_ns() - start)
+        return wrapper_aggregate
+
+    # same as `generic`, with func's own signature: no *args/**kwargs packing
+    wrapper_aggregate = make_wrapper(
+        func,
+        _AGGREGATE_BODY,
+        {"_enabled": enabled, "_record": record, "_perf_counter_ns": perf_counter_ns},
+        fallback=generic,
+    )
+    wrapper_aggregate.histogram = hist
+    return wrapper_aggregate
+
+
+def timer(_func=None, *, aggregate=False, report_at_exit=True):
+    def decorator_timer(func):
+        if aggregate:
+            return _aggregate(func, report_at_exit)
+
+        @functools.wraps(func)
+        def wrapper_decorator(*args, **kwargs):
+            start_time = time.perf_counter()
+            value = func(*args, **kwargs)
+            finish_time = time.perf_counter()
+            print(f"Finished in {(finish_time-start_time):.7f} sec")
+            return value
+        return wrapper_decorator
+
+    if _func is None:
+        return decorator_timer
+    else:
+        return decorator_timer(_func)
 
 
 @timer
@@ -19,3 +240,28 @@ def test():
 
 if __name__ == "__main__":
     test()
+
+    @timer(aggregate=True)
+    def square_sum(n):
+        return sum(i * i for i in range(n))
+
+    for n in range(10_000):
+        square_sum(n % 500)
+    # a report is also printed at exit
+    print(square_sum.histogram.summary())
+
+    # overhead per call of the aggregating wrapper, recording on and off
+    import timeit
+
+    def noop():
+        pass
+
+    timed_noop = timer(aggregate=True, report_at_exit=False)(noop)
+    number = 1_000_000
+    base = timeit.timeit(noop, number=number)
+    on = timeit.timeit(timed_noop, number=number)
+    disable()
+    off = timeit.timeit(timed_noop, number=number)
+    enable()
+    print(f"overhead per call: enabled {(on - base) / number * 1e9:.0f} ns, "
+        f"disabled {(off - base) / number * 1e9:.0f} ns")
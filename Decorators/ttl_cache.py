@@ -0,0 +1,145 @@
+'''
+A thread-safe LRU cache decorator that, unlike functools.lru_cache, can
+also bound the cache by (approximate) size in bytes, expire entries after
+`ttl` seconds, and drop one entry with `invalidate(*args, **kwargs)`.
+
+Sizes come from sys.getsizeof by default, which is shallow: pass your own
+`sizeof` for containers whose items should be counted too.
+'''
+
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple(
+	"CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize", "bytes"]
+)
+
+_KWD_MARK = object()
+
+
+def _make_key(args, kwargs):
+	return args + (_KWD_MARK,) + tuple(sorted(kwargs.items()))
+
+
+def ttl_cache(_func=None, *, maxsize=128, maxbytes=None, ttl=None, sizeof=sys.getsizeof):
+	def decorator_ttl_cache(func):
+		cache = OrderedDict()		# key -> (value, size, expires_at)
+		lock = threading.Lock()
+		# bound methods looked up once, this is the hot path
+		cache_get, move_to_end, monotonic = cache.get, cache.move_to_end, time.monotonic
+		# counters and total size, only changed with the lock held
+		hits = misses = evictions = nbytes = 0
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			nonlocal hits, misses, evictions, nbytes
+			key = _make_key(args, kwargs) if kwargs else args
+			with lock:
+				entry = cache_get(key)
+				if entry is not None:
+					if ttl is None or entry[2] > monotonic():
+						move_to_end(key)
+						hits += 1
+						return entry[0]
+					# expired, forget it and compute again
+					del cache[key]
+					nbytes -= entry[1]
+				misses += 1
+
+			# call outside the lock, other threads keep hitting the cache
+			value = func(*args, **kwargs)
+
+			size = sizeof(value) if maxbytes is not None else 0
+			if maxbytes is not None and size > maxbytes:
+				return value		# would evict everything else, don't cache
+			expires_at = monotonic() + ttl if ttl is not None else None
+			with lock:
+				old = cache.pop(key, None)
+				if old is not None:		# another thread computed it meanwhile
+					nbytes -= old[1]
+				cache[key] = (value, size, expires_at)
+				nbytes += size
+				while (maxsize is not None and len(cache) > maxsize) or (
+					maxbytes is not None and nbytes > maxbytes
+				):
+					_, (_, old_size, _) = cache.popitem(last=False)
+					nbytes -= old_size
+					evictions += 1
+			return value
+
+		def invalidate(*args, **kwargs):
+			nonlocal nbytes
+			with lock:
+				entry = cache.pop(_make_key(args, kwargs) if kwargs else args, None)
+				if entry is not None:
+					nbytes -= entry[1]
+			return entry is not None
+
+		def cache_info():
+			with lock:
+				return CacheInfo(hits, misses, evictions, maxsize, len(cache), nbytes)
+
+		def cache_clear():
+			nonlocal hits, misses, evictions, nbytes
+			with lock:
+				cache.clear()
+				hits = misses = evictions = nbytes = 0
+
+		wrapper.invalidate = invalidate
+		wrapper.cache_info = cache_info
+		wrapper.cache_clear = cache_clear
+		return wrapper
+
+	if _func is None:
+		return decorator_ttl_cache
+	else:
+		return decorator_ttl_cache(_func)
+
+
+if __name__ == "__main__":
+	import concurrent.futures
+	import timeit
+
+	@ttl_cache(maxsize=4, ttl=60)
+	def fibonacci(num):
+		print(f"Calculating Fibonacci: {num}")
+		if num < 2:
+			return num
+		return fibonacci(num-1) + fibonacci(num-2)
+
+	print(fibonacci(4))
+	print(fibonacci.cache_info())
+	fibonacci.invalidate(4)
+	print(fibonacci(4))
+
+	# byte bounded: keep at most ~1 MB of results
+	@ttl_cache(maxsize=None, maxbytes=1024 * 1024)
+	def blob(n):
+		return b"x" * n
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+		list(executor.map(blob, [i % 16 * 1024 for i in range(10_000)]))
+	print(blob.cache_info())
+
+	# overhead per hit compared to functools.lru_cache
+	@functools.lru_cache(maxsize=128)
+	def fib_lru(num):
+		return num if num < 2 else fib_lru(num-1) + fib_lru(num-2)
+
+	@ttl_cache(maxsize=128)
+	def fib_ttl(num):
+		return num if num < 2 else fib_ttl(num-1) + fib_ttl(num-2)
+
+	@ttl_cache(maxsize=128, maxbytes=1024 * 1024, ttl=60)
+	def fib_ttl_bytes(num):
+		return num if num < 2 else fib_ttl_bytes(num-1) + fib_ttl_bytes(num-2)
+
+	number = 1_000_000
+	for name, func in (("functools.lru_cache", fib_lru), ("ttl_cache", fib_ttl),
+					("ttl_cache ttl+bytes", fib_ttl_bytes)):
+		func(30)		# warm the cache, every call below is a hit
+		per_hit = timeit.timeit(lambda: func(30), number=number) / number
+		print(f"{name:<22}{per_hit * 1e9:>8.0f} ns per hit")
@@ -0,0 +1,139 @@
+'''
+Generate wrappers with the exact signature of the function they wrap.
+
+The usual wrapper, `def wrapper(*args, **kwargs): ... func(*args, **kwargs)`,
+packs every call's arguments into a tuple and a dict and unpacks them again.
+make_wrapper writes the wrapper's source instead, with the same parameters
+as the wrapped function, so the arguments are passed straight through:
+
+	def _generated_wrapper(a, b=_default_b, *, scale=_default_scale):
+		<body, with {call} replaced by _func(a, b, scale=scale)>
+
+The body is the decorator's code around the call. `_func` is the wrapped
+function, every other name comes from `namespace`.
+'''
+
+import functools
+import inspect
+import re
+import textwrap
+
+_PARAM = inspect.Parameter
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+
+def _signature_source(signature):
+	"""Return (parameters source, call arguments source, defaults)."""
+	params, call, defaults = [], [], {}
+	star_done = False
+	previous_kind = None
+	for param in signature.parameters.values():
+		name, kind = param.name, param.kind
+		text = name
+		if param.default is not _PARAM.empty:
+			defaults[f"_default_{name}"] = param.default
+			text = f"{name}=_default_{name}"
+		if previous_kind is _PARAM.POSITIONAL_ONLY and kind is not _PARAM.POSITIONAL_ONLY:
+			params.append("/")
+		previous_kind = kind
+
+		if kind is _PARAM.POSITIONAL_ONLY or kind is _PARAM.POSITIONAL_OR_KEYWORD:
+			params.append(text)
+			call.append(name)
+		elif kind is _PARAM.VAR_POSITIONAL:
+			params.append(f"*{name}")
+			call.append(f"*{name}")
+			star_done = True
+		elif kind is _PARAM.KEYWORD_ONLY:
+			if not star_done:
+				params.append("*")
+				star_done = True
+			params.append(text)
+			call.append(f"{name}={name}")
+		else:		# VAR_KEYWORD
+			params.append(f"**{name}")
+			call.append(f"**{name}")
+
+	if previous_kind is _PARAM.POSITIONAL_ONLY:
+		params.append("/")
+	return ", ".join(params), ", ".join(call), defaults
+
+
+def make_wrapper(func, body, namespace=None, fallback=None):
+	"""
+		Compile a wrapper of `func` running `body`, where `{call}` stands for
+		the call of `func` with the wrapper's own arguments.
+
+		When that can't be done (no signature, e.g. some builtins, or a
+		parameter named like a name used in `body`), return fallback(func),
+		the decorator's generic *args/**kwargs wrapper, or raise ValueError
+		without one.
+	"""
+	try:
+		signature = inspect.signature(func, follow_wrapped=False)
+	except (TypeError, ValueError):
+		signature = None
+
+	namespace = dict(namespace or {})
+	if signature is not None:
+		params, call, defaults = _signature_source(signature)
+		used = set(_IDENTIFIER.findall(body)) | set(namespace) | {"_func"}
+		if used.isdisjoint(signature.parameters):
+			namespace.update(defaults)
+			namespace["_func"] = func
+			# a fixed name, so a function called like a namespace entry (_func,
+			# _record, ...) can't overwrite it; update_wrapper sets __name__
+			name = "_generated_wrapper"
+			source = f"def {name}({params}):\n" + textwrap.indent(
+				body.strip("\n").replace("{call}", f"_func({call})"), "    "
+			)
+			code = compile(source, f"<wrapper of {func.__qualname__}>", "exec")
+			exec(code, namespace)
+			return functools.update_wrapper(namespace.pop(name), func)
+
+	if fallback is None:
+		raise ValueError(f"can't generate a wrapper with the signature of {func!r}")
+	return fallback(func)
+
+
+if __name__ == "__main__":
+	import timeit
+
+	def generic(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			return func(*args, **kwargs)
+		return wrapper
+
+	def generated(func):
+		return make_wrapper(func, "return {call}", fallback=generic)
+
+	def positional(a, b, c):
+		pass
+
+	def keyword(*, a, b, c):
+		pass
+
+	def defaulted(a, b=2, c=3):
+		pass
+
+	cases = (
+		("positional", positional, "f(1, 2, 3)"),
+		("keyword", keyword, "f(a=1, b=2, c=3)"),
+		("defaulted", defaulted, "f(1)"),
+	)
+	number = 1_000_000
+	print(f"{'call':<12}{'bare':>10}{'generic':>10}{'generated':>11}   overhead ns per call")
+	for name, func, stmt in cases:
+		timings = []
+		for wrapped in (func, generic(func), generated(func)):
+			timings.append(min(timeit.repeat(stmt, globals={"f": wrapped}, number=number, repeat=5)))
+		bare, gen, made = (t / number * 1e9 for t in timings)
+		print(f"{name:<12}{bare:>10.0f}{gen - bare:>10.0f}{made - bare:>11.0f}")
+
+	print(inspect.signature(generated(defaulted)))
+	generated(defaulted)(1, c=4)
+	try:
+		generated(keyword)(1, 2, 3)		# same error as calling keyword() itself
+	except TypeError as e:
+		print(e)
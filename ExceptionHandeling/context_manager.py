@@ -2,6 +2,13 @@
 Use of context manager to prevent writing finally block in exceptional handeling 
 """
 
+import mmap
+import os
+import stat
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from customer_exception import FileDoNotExistsException, FileEmptyException, NotAbleToReadException
 
 
@@ -10,25 +17,227 @@ class FileOpener:
 		A context manager to open a read connection to file
 	"""
 	
-	def __init__(self, filename) -> None:
+	def __init__(self, filename, mode='r', buffering=-1) -> None:
 		self.filename = filename
+		self.mode = mode
+		self.buffering = buffering
 
 	def __enter__(self):
-		self.conn = open(self.filename, 'r')
+		self.conn = open(self.filename, self.mode, self.buffering)
 		return self.conn
 
 	def __exit__(self, type, value, traceback):
 		self.conn.close()
 
 
+class PooledFile:
+	"""
+		An open descriptor kept by a FilePool. Reads use os.pread, which
+		doesn't move a shared file position, so threads can share it.
+	"""
+
+	def __init__(self, filename, fd, info) -> None:
+		self.filename = filename
+		self.fd = fd
+		self.ino = info.st_ino
+		self.mtime_ns = info.st_mtime_ns
+		self.size = info.st_size
+		self.users = 0			# blocks currently using it, guarded by the pool lock
+		self.evicted = False	# close it when the last user is done
+
+	def read(self, size=-1, offset=0):
+		if size < 0:
+			size = self.size - offset
+		return os.pread(self.fd, size, offset)
+
+
+class FilePool:
+	"""
+		Keep up to `max_open` files open, least recently used closed first, so
+		the same files read again and again cost a stat() instead of
+		open()/close(). A file is opened again when its inode, size or mtime
+		changed (replaced or modified).
+	"""
+
+	def __init__(self, max_open=128) -> None:
+		self.max_open = max_open
+		self.files = OrderedDict()		# filename -> PooledFile
+		self.lock = threading.Lock()
+		self.hits = self.misses = 0
+
+	def open(self, filename):
+		return PooledFileOpener(filename, self)
+
+	def _acquire(self, filename):
+		info = os.stat(filename)		# one syscall instead of open + close
+		with self.lock:
+			pooled = self.files.get(filename)
+			if pooled is not None and pooled.ino == info.st_ino and pooled.size == info.st_size \
+					and pooled.mtime_ns == info.st_mtime_ns:
+				self.files.move_to_end(filename)
+				pooled.users += 1
+				self.hits += 1
+				return pooled
+			if pooled is not None:		# stale, the file changed
+				self._evict(filename)
+			self.misses += 1
+
+		fd = os.open(filename, os.O_RDONLY)
+		# stat again through the descriptor, the file may have changed meanwhile
+		pooled = PooledFile(filename, fd, os.fstat(fd))
+		pooled.users = 1
+		with self.lock:
+			if filename in self.files:		# another thread opened it too
+				self._evict(filename)
+			self.files[filename] = pooled
+			while len(self.files) > self.max_open:
+				self._evict(next(iter(self.files)))
+		return pooled
+
+	def _release(self, pooled):
+		with self.lock:
+			pooled.users -= 1
+			close = pooled.evicted and not pooled.users
+		if close:
+			os.close(pooled.fd)
+
+	def _evict(self, filename):
+		# lock held. A descriptor still in use is closed by its last user
+		pooled = self.files.pop(filename)
+		pooled.evicted = True
+		if not pooled.users:
+			os.close(pooled.fd)
+
+	def close(self):
+		with self.lock:
+			for filename in list(self.files):
+				self._evict(filename)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+
+class PooledFileOpener:
+	"""
+		FileOpener taking its descriptor from a FilePool: leaving the block
+		gives it back to the pool instead of closing it
+	"""
+
+	def __init__(self, filename, pool) -> None:
+		self.filename = filename
+		self.pool = pool
+
+	def __enter__(self):
+		self.conn = self.pool._acquire(self.filename)
+		return self.conn
+
+	def __exit__(self, type, value, traceback):
+		self.pool._release(self.conn)
+
+
+class ReadResult(namedtuple("ReadResult", ["filename", "content", "error"])):
+	"""
+		Outcome of one file of ReadData.read_many: the content, or the
+		FileDoNotExistsException / FileEmptyException / NotAbleToReadException
+		reading it raised
+	"""
+	__slots__ = ()
+
+	@property
+	def ok(self):
+		return self.error is None
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "currsize", "bytes"])
+
+
+class ContentCache:
+	"""
+		Contents of files read through ReadData(filename, cache=...), least
+		recently used dropped first once they add up to more than `max_bytes`.
+		Each read stats the file and serves the cached content only if its
+		(inode, size, mtime) didn't change, so an unchanged file costs one
+		stat() instead of open() + read() + close(). A change that keeps the
+		size and lands within the same mtime tick goes unnoticed.
+	"""
+
+	def __init__(self, max_bytes=16 * 1024 * 1024) -> None:
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()		# filename -> ((st_ino, st_size, st_mtime_ns), content)
+		self.nbytes = 0
+		self.lock = threading.Lock()
+		self.hits = self.misses = self.evictions = 0
+
+	def get(self, reader):
+		info = reader._check()		# raises the same exceptions as reading
+		version = (info.st_ino, info.st_size, info.st_mtime_ns)
+		filename = reader.filename
+		with self.lock:
+			entry = self.entries.get(filename)
+			if entry is not None and entry[0] == version:
+				self.entries.move_to_end(filename)
+				self.hits += 1
+				return entry[1]
+			self.misses += 1
+
+		# stat'ed before reading: if the file changes while it is read, the
+		# next stat won't match and it is read again
+		content = reader._read()
+		if info.st_size > self.max_bytes:
+			return content
+		with self.lock:
+			old = self.entries.pop(filename, None)
+			if old is not None:
+				self.nbytes -= old[0][1]
+			self.entries[filename] = (version, content)
+			self.nbytes += info.st_size
+			while self.nbytes > self.max_bytes:
+				(_, size, _), _ = self.entries.popitem(last=False)[1]
+				self.nbytes -= size
+				self.evictions += 1
+		return content
+
+	def invalidate(self, filename):
+		with self.lock:
+			entry = self.entries.pop(filename, None)
+			if entry is not None:
+				self.nbytes -= entry[0][1]
+		return entry is not None
+
+	def cache_info(self):
+		with self.lock:
+			return CacheInfo(self.hits, self.misses, self.evictions, len(self.entries), self.nbytes)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.nbytes = self.hits = self.misses = self.evictions = 0
+
+
 class ReadData:
-	def __init__(self, filename) -> None:
+	def __init__(self, filename, cache=None) -> None:
 		self.filename = filename
+		self.cache = cache		# optional ContentCache
 
 	def readfile(self):
 		"""
 			throws : NotAbleToReadException and FileDoNotExistsException
 		"""
+		print(self.read())
+
+	def read(self):
+		"""
+			Return the content of the file, readfile without the print
+			throws : NotAbleToReadException and FileDoNotExistsException
+		"""
+		if self.cache is not None:
+			return self.cache.get(self)
+		return self._read()
+
+	def _read(self):
 		try:
 			# we don't need finally block as this 'with' context manager closes the file if 
 			# any exception occurs or when the block is exited
@@ -36,7 +245,7 @@ class ReadData:
 				content = file.read()
 				if not content:
 					raise FileEmptyException()
-				print(content)
+				return content
 		except FileNotFoundError as e:
 			# log error and raise another exception 
 			raise FileDoNotExistsException(self.filename)
@@ -47,6 +256,108 @@ class ReadData:
 			# So that the user of this module should handle only one type of unhandeled exception
 			raise NotAbleToReadException(self.filename)
 
+	@classmethod
+	def read_many(cls, filenames, max_workers=8, cache=None):
+		"""
+			Read files on `max_workers` threads and yield a ReadResult for each,
+			in the order they complete. A file that can't be read doesn't stop
+			the others, its exception is in the result.
+		"""
+		def read_one(filename):
+			try:
+				return ReadResult(filename, cls(filename, cache).read(), None)
+			except (FileDoNotExistsException, FileEmptyException, NotAbleToReadException) as e:
+				return ReadResult(filename, None, e)
+
+		filenames = iter(filenames)
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			# a few reads queued per thread, not one future per file up front
+			pending = set()
+			for filename in filenames:
+				pending.add(executor.submit(read_one, filename))
+				if len(pending) >= 4 * max_workers:
+					done, pending = wait(pending, return_when=FIRST_COMPLETED)
+					for future in done:
+						yield future.result()
+			while pending:
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					yield future.result()
+
+	# readfile holds the whole file in memory, and then prints it. For big
+	# files read it a piece at a time with readchunks / readlines, or map it
+	# with readmmap. They raise the same exceptions as readfile, and know
+	# the file is empty from os.stat, without reading it.
+
+	def _check(self):
+		"""
+			throws : FileDoNotExistsException, FileEmptyException and NotAbleToReadException
+		"""
+		try:
+			info = os.stat(self.filename)
+		except FileNotFoundError as e:
+			raise FileDoNotExistsException(self.filename)
+		except Exception as e:
+			raise NotAbleToReadException(self.filename)
+		# the size of a directory, pipe, ... says nothing about its content
+		if not stat.S_ISREG(info.st_mode):
+			raise NotAbleToReadException(self.filename)
+		if not info.st_size:
+			raise FileEmptyException(f"{self.filename} is empty")
+		return info
+
+	def _stream(self, pieces, mode, buffering=-1):
+		# the checks already ran, this only maps errors while reading
+		try:
+			with FileOpener(self.filename, mode, buffering) as file:
+				yield from pieces(file)
+		except FileNotFoundError as e:		# removed since the check
+			raise FileDoNotExistsException(self.filename)
+		except Exception as e:
+			raise NotAbleToReadException(self.filename)
+
+	def readchunks(self, chunk_size=64 * 1024):
+		"""
+			Generator of `chunk_size` bytes pieces of the file, the last may be shorter
+			throws : FileDoNotExistsException, FileEmptyException and NotAbleToReadException
+		"""
+		self._check()		# raise now, not at the first next()
+
+		def chunks(file):
+			while True:
+				chunk = file.read(chunk_size)
+				if not chunk:
+					return
+				yield chunk
+		# unbuffered: read() fills each chunk straight from the file
+		return self._stream(chunks, 'rb', buffering=0)
+
+	def readlines(self):
+		"""
+			Generator of the lines of the file, as str
+			throws : FileDoNotExistsException, FileEmptyException and NotAbleToReadException
+		"""
+		self._check()
+		return self._stream(iter, 'r')
+
+	def readmmap(self):
+		"""
+			The whole file as a read-only memoryview of a memory map: nothing is
+			copied, the OS pages the file in as it is accessed. Release it with
+			`view.release()` or use it in a `with` block.
+			throws : FileDoNotExistsException, FileEmptyException and NotAbleToReadException
+		"""
+		self._check()
+		try:
+			with FileOpener(self.filename, 'rb') as file:
+				# the map stays valid after the file is closed
+				mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		except FileNotFoundError as e:
+			raise FileDoNotExistsException(self.filename)
+		except Exception as e:
+			raise NotAbleToReadException(self.filename)
+		return memoryview(mapped)
+
 
 if __name__ == "__main__":
 	# throws FileDoNotExistsException and then NotAbleToReadException
@@ -60,3 +371,151 @@ if __name__ == "__main__":
 	# do not throw any exception
 	rd = ReadData('exists.txt')
 	rd.readfile()
+
+	# peak memory of the ways to go through a big file
+	import tempfile
+	import time
+	import tracemalloc
+
+	with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as big:
+		for i in range(500_000):
+			big.write(f"2021-06-01 12:00:00 INFO request {i} served\n")
+	size = os.path.getsize(big.name)
+	rd = ReadData(big.name)
+
+	def whole():
+		with FileOpener(big.name) as file:
+			return file.read().count('\n')
+
+	def by_chunks():
+		return sum(chunk.count(b'\n') for chunk in rd.readchunks())
+
+	def by_lines():
+		return sum(1 for _ in rd.readlines())
+
+	print(f"{size / 1e6:.1f} MB file")
+	for name, read in (("read()", whole), ("readchunks", by_chunks), ("readlines", by_lines)):
+		tracemalloc.start()
+		start = time.perf_counter()
+		lines = read()
+		elapsed = time.perf_counter() - start
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		print(f"{name:<12}{lines:>9} lines{elapsed * 1e3:>9.1f} ms{peak / 1e6:>9.2f} MB peak")
+
+	# a memory map shines at random access: only the pages touched are read
+	tracemalloc.start()
+	start = time.perf_counter()
+	with rd.readmmap() as view:
+		last_start = view.obj.rfind(b'\n', 0, len(view) - 1) + 1
+		last = bytes(view[last_start:])
+	elapsed = time.perf_counter() - start
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	print(f"readmmap, last line {last!r}{elapsed * 1e3:>9.1f} ms{peak / 1e6:>9.2f} MB peak")
+	os.remove(big.name)
+
+	# repeated small reads of the same files, with and without a pool
+	import shutil
+	from concurrent.futures import ThreadPoolExecutor
+
+	directory = tempfile.mkdtemp()
+	names = []
+	for i in range(300):
+		names.append(os.path.join(directory, f"config-{i}.ini"))
+		with open(names[-1], 'w') as config:
+			config.write(f"[server]\nport = {8000 + i}\n")
+	reads = [names[i % len(names)] for i in range(100_000)]
+
+	def unpooled(name):
+		with FileOpener(name, 'rb') as file:
+			return file.read()
+
+	pool = FilePool(max_open=512)
+
+	def pooled(name):
+		with pool.open(name) as file:
+			return file.read()
+
+	small_pool = FilePool(max_open=100)		# smaller than the set of files
+
+	def pooled_small(name):
+		with small_pool.open(name) as file:
+			return file.read()
+
+	print(f"{'reads of 300 small files':<26}{'threads':>8}{'us per read':>13}")
+	for threads in (1, 8):
+		for name, read in (("FileOpener", unpooled), ("FilePool", pooled), ("FilePool, 100 fds", pooled_small)):
+			start = time.perf_counter()
+			with ThreadPoolExecutor(max_workers=threads) as executor:
+				list(executor.map(read, reads, chunksize=1000))
+			elapsed = time.perf_counter() - start
+			print(f"{name:<26}{threads:>8}{elapsed / len(reads) * 1e6:>13.2f}")
+	print(f"pool hits {pool.hits}, misses {pool.misses}")
+
+	# a modified file is opened again
+	with open(names[0], 'a') as config:
+		config.write("workers = 4\n")
+	print(pooled(names[0]))
+	pool.close()
+	small_pool.close()
+	shutil.rmtree(directory)
+
+	# scan a directory of small files, one at a time and with read_many
+	directory = tempfile.mkdtemp()
+	names = []
+	for i in range(5000):
+		names.append(os.path.join(directory, f"record-{i}.json"))
+		with open(names[-1], 'w') as record:
+			record.write('{"id": %d, "payload": "%s"}\n' % (i, "x" * (i % 1000)))
+	open(os.path.join(directory, "empty.json"), 'w').close()
+	names += [os.path.join(directory, "empty.json"), os.path.join(directory, "missing.json")]
+
+	class NetworkReadData(ReadData):
+		# stand-in for a network file system: 1 ms of latency per file
+		def read(self):
+			time.sleep(0.001)
+			return super().read()
+
+	def sequential(reader, names):
+		results = []
+		for name in names:
+			try:
+				results.append(ReadResult(name, reader(name).read(), None))
+			except (FileDoNotExistsException, FileEmptyException, NotAbleToReadException) as e:
+				results.append(ReadResult(name, None, e))
+		return results
+
+	print(f"{'reading 5002 files':<34}{'files/s':>10}{'MB/s':>8}")
+	for reader, storage in ((ReadData, "local"), (NetworkReadData, "1 ms latency")):
+		scans = [("one at a time", lambda: sequential(reader, names))] + [
+			(f"read_many, {workers} threads", lambda workers=workers: list(reader.read_many(names, workers)))
+			for workers in (4, 16)
+		]
+		for name, scan in scans:
+			start = time.perf_counter()
+			results = scan()
+			elapsed = time.perf_counter() - start
+			nbytes = sum(len(result.content) for result in results if result.ok)
+			print(f"{storage + ', ' + name:<34}{len(results) / elapsed:>10.0f}{nbytes / elapsed / 1e6:>8.1f}")
+	print([type(result.error).__name__ for result in results if not result.ok])
+
+	# config files read on every request, with and without a content cache
+	cache = ContentCache(max_bytes=1024 * 1024)
+	configs = names[:200]
+	requests = [configs[i % len(configs)] for i in range(50_000)]
+	print(f"{'50 000 reads of 200 files':<26}{'us per read':>13}")
+	for name, cached in (("no cache", None), ("ContentCache", cache)):
+		start = time.perf_counter()
+		for filename in requests:
+			ReadData(filename, cached).read()
+		elapsed = time.perf_counter() - start
+		print(f"{name:<26}{elapsed / len(requests) * 1e6:>13.2f}")
+	print(cache.cache_info())
+
+	# a modified file is read again
+	with open(configs[0], 'w') as config:
+		config.write('{"id": 0, "payload": "changed"}\n')
+	print(ReadData(configs[0], cache).read(), end='')
+	print(cache.cache_info())
+	shutil.rmtree(directory)
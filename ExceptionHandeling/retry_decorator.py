@@ -1,3 +1,7 @@
+import asyncio
+import inspect
+import random
+import threading
 import time
 from functools import wraps
 
@@ -39,8 +43,267 @@ def retry(ExceptionToCheck, tries=4, delay=3, backoff=2, logger=None):
 
     return deco_retry
 
-@retry(Exception, tries=3)
-def test_fail(text):
-    raise Exception("Fail")
 
-test_fail("it works!")
+# ---------------- retry with backoff, budget and circuit breaker ----------------
+# `retry` sleeps with time.sleep, which blocks the whole event loop when the
+# decorated function is a coroutine, and every call retries on its own, so
+# when a downstream service goes down all callers hammer it together.
+# `backoff_retry` awaits asyncio.sleep for coroutine functions, spreads the
+# retries with full jitter, and can share a RetryBudget and a CircuitBreaker
+# between all the functions calling the same service.
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of calling the function while the circuit is open
+    """
+    pass
+
+
+class RetryBudget:
+    """
+    Token bucket shared by the callers of one service: every retry takes a
+    token, tokens come back at `rate` per second up to `capacity`. When the
+    bucket is empty failures are raised right away instead of retried.
+    """
+
+    def __init__(self, rate=1.0, capacity=10):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open every
+    call fails fast with CircuitOpenError. After `reset_timeout` seconds one
+    trial call is let through: success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None       # None while closed
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True       # half open, this caller is the trial
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release_trial(self):
+        # the call ended without an answer (cancelled, interrupted): let the
+        # next caller be the trial, without counting a failure
+        with self.lock:
+            self.trial_running = False
+
+
+class RetryMetrics:
+    """
+    Counters of one decorated function.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.attempts = 0           # calls of the function itself
+        self.successes = 0
+        self.failures = 0           # calls that raised in the end
+        self.retries = 0
+        self.short_circuits = 0     # calls refused by the circuit breaker
+        self.budget_exhausted = 0   # retries refused by the retry budget
+
+    def add(self, name, value=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: getattr(self, name)
+                for name in ("attempts", "successes", "failures", "retries",
+                             "short_circuits", "budget_exhausted")
+            }
+
+
+def backoff_retry(ExceptionToCheck, tries=4, delay=0.1, backoff=2, max_delay=10.0,
+                  budget=None, breaker=None, logger=None):
+    """
+    :param ExceptionToCheck: the exception to check. may be a tuple of
+        exceptions to check
+    :type ExceptionToCheck: Exception or tuple
+    :param tries: number of times to try (not retry) before giving up
+    :type tries: int
+    :param delay: base delay in seconds, the n-th retry sleeps a random time
+        between 0 and min(max_delay, delay * backoff ** n) (full jitter)
+    :type delay: float
+    :param backoff: backoff multiplier
+    :type backoff: float
+    :param max_delay: cap on the backoff in seconds
+    :type max_delay: float
+    :param budget: retry budget, may be shared between functions
+    :type budget: RetryBudget or None
+    :param breaker: circuit breaker, may be shared between functions
+    :type breaker: CircuitBreaker or None
+    :param logger: logger to use. If None, print
+    :type logger: logging.Logger instance
+    """
+    def deco_retry(f):
+        metrics = RetryMetrics()
+
+        def before_attempt():
+            if breaker is not None and not breaker.allow():
+                metrics.add("short_circuits")
+                raise CircuitOpenError(f.__qualname__)
+            metrics.add("attempts")
+
+        def on_success():
+            if breaker is not None:
+                breaker.record_success()
+            metrics.add("successes")
+
+        def on_unexpected():
+            # an exception we don't retry still counts against the service
+            if breaker is not None:
+                breaker.record_failure()
+            metrics.add("failures")
+
+        def on_interrupted():
+            # cancelled (e.g. by asyncio.wait_for) or interrupted, the call
+            # says nothing about the service
+            if breaker is not None:
+                breaker.release_trial()
+
+        def on_failure(e, attempt):
+            """Return the delay before the next attempt, or None to give up."""
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt == tries - 1:
+                metrics.add("failures")
+                return None
+            if budget is not None and not budget.try_acquire():
+                metrics.add("budget_exhausted")
+                metrics.add("failures")
+                return None
+            metrics.add("retries")
+            mdelay = random.uniform(0, min(max_delay, delay * backoff ** attempt))
+            msg = "%s, Retrying in %.2f seconds..." % (str(e), mdelay)
+            if logger:
+                logger.warning(msg)
+            else:
+                print(msg)
+            return mdelay
+
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def f_retry(*args, **kwargs):
+                for attempt in range(tries):
+                    before_attempt()
+                    try:
+                        result = await f(*args, **kwargs)
+                    except ExceptionToCheck as e:
+                        mdelay = on_failure(e, attempt)
+                        if mdelay is None:
+                            raise
+                        await asyncio.sleep(mdelay)
+                    except Exception:
+                        on_unexpected()
+                        raise
+                    except BaseException:
+                        on_interrupted()
+                        raise
+                    else:
+                        on_success()
+                        return result
+        else:
+            @wraps(f)
+            def f_retry(*args, **kwargs):
+                for attempt in range(tries):
+                    before_attempt()
+                    try:
+                        result = f(*args, **kwargs)
+                    except ExceptionToCheck as e:
+                        mdelay = on_failure(e, attempt)
+                        if mdelay is None:
+                            raise
+                        time.sleep(mdelay)
+                    except Exception:
+                        on_unexpected()
+                        raise
+                    except BaseException:
+                        on_interrupted()
+                        raise
+                    else:
+                        on_success()
+                        return result
+
+        f_retry.metrics = metrics
+        return f_retry
+
+    return deco_retry
+
+
+if __name__ == "__main__":
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.5)
+    budget = RetryBudget(rate=2, capacity=5)
+    calls = []
+    down_until = time.monotonic() + 0.3     # the service is down for 0.3 seconds
+
+    @backoff_retry(ConnectionError, tries=3, delay=0.01, budget=budget, breaker=breaker)
+    async def fetch(i):
+        calls.append(i)
+        await asyncio.sleep(0.001)
+        if time.monotonic() < down_until:
+            raise ConnectionError("service down")
+        return i
+
+    async def main():
+        # 100 concurrent requests on one event loop, none of them blocks it
+        results = await asyncio.gather(*(fetch(i) for i in range(100)), return_exceptions=True)
+        print("first wave:", {type(r).__name__ for r in results}, fetch.metrics.snapshot())
+        await asyncio.sleep(0.6)        # the service is back, the breaker lets a trial call through
+        results = [await fetch(i) for i in range(10)]
+        print("after reset:", results)
+        print(fetch.metrics.snapshot(), f"{len(calls)} calls reached the service")
+
+    asyncio.run(main())
+
+    @retry(Exception, tries=3)
+    def test_fail(text):
+        raise Exception("Fail")
+
+    test_fail("it works!")
@@ -1,5 +1,7 @@
 import logging
 
+from queue_logging import setup_queue_logging
+
 # name is a string : equals __main__ when we exe this file and 
 # equals employee.py when exe from another module
 logger = logging.getLogger(__name__)
@@ -14,6 +16,8 @@ file_handler = logging.FileHandler('employee.log')
 file_handler.setFormatter(formatter)
 # add formatter to logger
 logger.addHandler(file_handler)
+# write the logs on a background thread, Employee() only queues them
+setup_queue_logging(logger)
 
 
 class Employee:
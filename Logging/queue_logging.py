@@ -0,0 +1,145 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# With handlers attached to the logger, every logger.info formats the record
+# and writes it to the file on the caller's thread. setup_queue_logging moves
+# the logger's handlers behind a queue: the caller only puts the record on
+# the queue, a background thread (QueueListener) formats and writes it.
+
+BLOCK = "block"				# caller waits for room in the queue, nothing lost
+DROP_NEW = "drop_new"		# the new record is dropped
+DROP_OLDEST = "drop_oldest"	# the oldest queued record is dropped to make room
+
+
+class BoundedQueueHandler(QueueHandler):
+	"""
+		QueueHandler for a bounded queue, with what to do when it is full
+	"""
+
+	def __init__(self, log_queue, overflow=BLOCK):
+		if overflow not in (BLOCK, DROP_NEW, DROP_OLDEST):
+			raise ValueError(f"unknown overflow policy {overflow!r}")
+		super().__init__(log_queue)
+		self.overflow = overflow
+		self.dropped = 0
+
+	def prepare(self, record):
+		# QueueHandler.prepare formats the whole record (traceback included) on
+		# the caller's thread. Only merge the arguments into the message, so
+		# later changes to them don't show; the listener does the formatting.
+		record.msg = record.getMessage()
+		record.args = None
+		return record
+
+	def enqueue(self, record):
+		if self.overflow == BLOCK:
+			self.queue.put(record)
+			return
+		while True:
+			try:
+				self.queue.put_nowait(record)
+				return
+			except queue.Full:
+				if self.overflow == DROP_NEW:
+					self.dropped += 1
+					return
+			try:
+				self.queue.get_nowait()
+				self.queue.task_done()
+				self.dropped += 1
+			except queue.Empty:		# the listener emptied it meanwhile
+				pass
+
+
+class FlushingQueueListener(QueueListener):
+	"""
+		QueueListener whose stop() waits for every queued record to be written
+		and flushes the handlers, even when the queue is full
+	"""
+
+	def enqueue_sentinel(self):
+		self.queue.put(self._sentinel)		# put_nowait would fail on a full queue
+
+	def stop(self):
+		if self._thread is None:
+			return
+		super().stop()
+		for handler in self.handlers:
+			handler.flush()
+
+
+def setup_queue_logging(logger, maxsize=10000, overflow=BLOCK):
+	"""
+		Move the handlers of `logger` behind a queue of `maxsize` records and
+		start the thread writing them. Levels set on the handlers still apply.
+		The queue is drained at exit, or call stop() on the returned listener.
+	"""
+	handlers = list(logger.handlers)
+	for handler in handlers:
+		logger.removeHandler(handler)
+
+	log_queue = queue.Queue(maxsize)
+	queue_handler = BoundedQueueHandler(log_queue, overflow)
+	logger.addHandler(queue_handler)
+
+	listener = FlushingQueueListener(log_queue, *handlers, respect_handler_level=True)
+	listener.queue_handler = queue_handler		# for its `dropped` count
+	listener.start()
+	atexit.register(listener.stop)
+	return listener
+
+
+if __name__ == "__main__":
+	import os
+	import shutil
+	import tempfile
+	import time
+
+	directory = tempfile.mkdtemp()
+
+	class SlowFileHandler(logging.FileHandler):
+		# stand-in for a slow or busy disk: 0.2 ms per write
+		def emit(self, record):
+			time.sleep(0.0002)
+			super().emit(record)
+
+	def measure(name, queued=None, handler_class=logging.FileHandler, calls=20_000):
+		logger = logging.getLogger(f"benchmark.{name}")
+		logger.propagate = False
+		logger.setLevel(logging.INFO)
+		file_handler = handler_class(os.path.join(directory, f"{name}.log"))
+		file_handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s:%(message)s'))
+		logger.addHandler(file_handler)
+		listener = setup_queue_logging(logger, **queued) if queued is not None else None
+
+		latencies = []
+		perf_counter_ns = time.perf_counter_ns
+		start = time.perf_counter()
+		for i in range(calls):
+			before = perf_counter_ns()
+			logger.info("Employee Created : %s %s", "Jane", i)
+			latencies.append(perf_counter_ns() - before)
+		elapsed = time.perf_counter() - start
+		if listener is not None:
+			listener.stop()
+		file_handler.close()
+
+		latencies.sort()
+		dropped = listener.queue_handler.dropped if listener is not None else 0
+		print(f"{name:<26}{sum(latencies) / calls / 1000:>8.1f}"
+			f"{latencies[calls // 2] / 1000:>8.1f}{latencies[calls * 99 // 100] / 1000:>8.1f}"
+			f"{calls / elapsed:>12.0f}{dropped:>9}")
+
+	print(f"{'handler':<26}{'mean':>8}{'p50':>8}{'p99':>8}{'calls/s':>12}{'dropped':>9}   (us per call)")
+	measure("FileHandler")
+	measure("queue, block", {"maxsize": 100_000})
+	measure("queue 1000, block", {"maxsize": 1000, "overflow": BLOCK})
+	measure("queue 1000, drop_new", {"maxsize": 1000, "overflow": DROP_NEW})
+	measure("queue 1000, drop_oldest", {"maxsize": 1000, "overflow": DROP_OLDEST})
+	measure("slow FileHandler", None, SlowFileHandler, 5000)
+	measure("slow, queue, block", {"maxsize": 100_000}, SlowFileHandler, 5000)
+	measure("slow, queue 1000, block", {"maxsize": 1000}, SlowFileHandler, 5000)
+	measure("slow, queue 1000, drop_new", {"maxsize": 1000, "overflow": DROP_NEW}, SlowFileHandler, 5000)
+	shutil.rmtree(directory)
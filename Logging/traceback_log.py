@@ -1,5 +1,7 @@
 import logging
 
+from queue_logging import setup_queue_logging
+
 logger = logging.getLogger(__name__)
 
 # set this logger to catch all log for DEBUG and above
@@ -26,6 +28,10 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(stream_handler)
 
+# format and write the logs on a background thread, divison only queues them
+# (the level of each handler still applies)
+setup_queue_logging(logger)
+
 
 def divison(num, den):
 	try:
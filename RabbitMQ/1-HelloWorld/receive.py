@@ -1,7 +1,12 @@
-import pika
 import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
 
 def main():
     # first we need to connect to RabbitMQ server.
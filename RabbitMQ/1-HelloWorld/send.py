@@ -1,5 +1,12 @@
 # Python client recommended by the RabbitMQ team
-import pika
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
 
 # The first thing we need to do is to establish a connection with RabbitMQ server.
 connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
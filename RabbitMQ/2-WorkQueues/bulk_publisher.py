@@ -0,0 +1,176 @@
+"""
+Stream many tasks into `task_queue` over one long lived channel.
+
+`new_task.py` pays a full TCP + AMQP handshake for every task. BulkPublisher
+keeps one connection open and uses publisher confirms in batches: it
+publishes up to `batch_size` messages (or whatever arrived within
+`batch_ms`), then waits until the broker has confirmed the whole batch
+before starting the next one. That keeps the at-least-once guarantee of
+confirms without a round trip per message.
+
+It runs on a `SelectConnection` because `BlockingChannel.confirm_delivery`
+waits for the confirm of every single publish.
+
+If the connection fails to open, or the connection or channel is closed
+before the input is done, `run()` returns with `error` set and the number
+of messages still `unconfirmed`: those may not have reached the broker.
+Only `ok` (all input read, every published message acked) means nothing
+was lost.
+"""
+
+import queue
+import threading
+import time
+
+import pika
+
+EOF = object()
+
+
+class BulkPublisher:
+    def __init__(self, lines, queue_name="task_queue", batch_size=1000, batch_ms=200,
+                 parameters=None):
+        self.queue_name = queue_name
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.parameters = parameters or pika.ConnectionParameters("localhost")
+
+        # read the input on its own thread so a slow or idle stdin never
+        # holds a batch open for longer than batch_ms
+        self.lines = queue.Queue(maxsize=batch_size * 4)
+        self.reader = threading.Thread(target=self._read, args=(lines,), daemon=True)
+
+        self.connection = None
+        self.channel = None
+        self.delivery_tag = 0
+        self.unconfirmed = set()
+        self.eof = False
+        self.closing = False      # we closed the connection after the last confirm
+        self.error = None
+        self.lost = 0             # unconfirmed messages when the connection closed
+
+        self.published = 0
+        self.acked = 0
+        self.nacked = 0
+        self.started = None
+
+    def _read(self, lines):
+        for line in lines:
+            line = line.rstrip("\n")
+            if line:
+                self.lines.put(line)
+        self.lines.put(EOF)
+
+    def run(self):
+        self.reader.start()
+        self.started = time.perf_counter()
+        self.connection = pika.SelectConnection(
+            self.parameters,
+            on_open_callback=self.on_connection_open,
+            on_open_error_callback=self.on_connection_error,
+            on_close_callback=self.on_connection_closed,
+        )
+        self.connection.ioloop.start()
+        return self.stats()
+
+    def on_connection_open(self, connection):
+        connection.channel(on_open_callback=self.on_channel_open)
+
+    def on_connection_error(self, connection, error):
+        print(" [!] Connection failed: %r" % error)
+        self.error = "connection failed: %r" % (error,)
+        connection.ioloop.stop()
+
+    def on_connection_closed(self, connection, reason):
+        self.lost = len(self.unconfirmed)
+        if not self.closing and self.error is None:
+            print(" [!] Connection closed: %r" % reason)
+            self.error = "connection closed: %r" % (reason,)
+        connection.ioloop.stop()
+
+    def on_channel_closed(self, channel, reason):
+        # the broker closed the channel (e.g. a queue declared with other
+        # arguments): nothing more can be published, close the connection
+        # so the ioloop stops instead of running for ever
+        if self.closing:
+            return
+        print(" [!] Channel closed: %r" % reason)
+        if self.error is None:
+            self.error = "channel closed: %r" % (reason,)
+        if self.connection.is_open:
+            self.connection.close()
+
+    def on_channel_open(self, channel):
+        self.channel = channel
+        channel.add_on_close_callback(self.on_channel_closed)
+        channel.queue_declare(
+            queue=self.queue_name, durable=True, callback=self.on_queue_declared
+        )
+
+    def on_queue_declared(self, frame):
+        self.channel.confirm_delivery(
+            self.on_delivery_confirmation, callback=lambda frame: self.publish_batch()
+        )
+
+    def publish_batch(self):
+        deadline = time.monotonic() + self.batch_ms / 1000
+        count = 0
+        while count < self.batch_size:
+            try:
+                line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if line is EOF:
+                self.eof = True
+                break
+            self.channel.basic_publish(
+                exchange="",
+                routing_key=self.queue_name,
+                body=line,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,  # make message persistent
+                ),
+            )
+            self.delivery_tag += 1
+            self.unconfirmed.add(self.delivery_tag)
+            count += 1
+        self.published += count
+
+        if not self.unconfirmed:
+            # nothing arrived in this window (or nothing left to confirm)
+            self.next_batch()
+
+    def on_delivery_confirmation(self, frame):
+        method = frame.method
+        if method.multiple:
+            confirmed = {tag for tag in self.unconfirmed if tag <= method.delivery_tag}
+        else:
+            confirmed = {method.delivery_tag} & self.unconfirmed
+        self.unconfirmed -= confirmed
+        if method.NAME == "Basic.Ack":
+            self.acked += len(confirmed)
+        else:
+            self.nacked += len(confirmed)
+
+        if not self.unconfirmed:
+            self.next_batch()
+
+    def next_batch(self):
+        if self.eof:
+            self.closing = True
+            self.connection.close()
+        else:
+            self.connection.ioloop.call_later(0, self.publish_batch)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "published": self.published,
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "unconfirmed": self.lost,
+            "error": self.error,
+            "ok": self.eof and self.error is None and self.acked == self.published,
+            "seconds": elapsed,
+            "msgs_per_sec": self.acked / elapsed if elapsed else 0.0,
+        }
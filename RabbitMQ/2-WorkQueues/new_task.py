@@ -1,13 +1,49 @@
-import pika
+import argparse
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
+parser = argparse.ArgumentParser(description="Send tasks to task_queue")
+parser.add_argument("message", nargs="*")
+parser.add_argument(
+    "--bulk", metavar="FILE",
+    help="stream one task per line from FILE ('-' for stdin) over one connection",
+)
+parser.add_argument("--batch-size", type=int, default=1000,
+                    help="wait for publisher confirms every N messages")
+parser.add_argument("--batch-ms", type=int, default=200,
+                    help="or every T milliseconds, whichever comes first")
+args = parser.parse_args()
+
+if args.bulk:
+    from bulk_publisher import BulkPublisher
+
+    source = sys.stdin if args.bulk == "-" else open(args.bulk)
+    with source:
+        stats = BulkPublisher(
+            source, batch_size=args.batch_size, batch_ms=args.batch_ms
+        ).run()
+    print(
+        " [x] Sent {published} tasks ({acked} confirmed, {nacked} rejected, "
+        "{unconfirmed} unconfirmed) in {seconds:.2f}s: {msgs_per_sec:.0f} msgs/sec".format(**stats)
+    )
+    if not stats["ok"]:
+        # input not fully sent, or some messages not confirmed by the broker
+        print(" [!] Not every task was confirmed: %s" % (stats["error"] or "rejected by the broker"))
+    sys.exit(0 if stats["ok"] else 1)
+
 connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
 channel = connection.channel()
 
 # channel.queue_declare(queue="hello")
 channel.queue_declare(queue="task_queue", durable=True)
 
-message = " ".join(sys.argv[1:]) or "Hello World!"
+message = " ".join(args.message) or "Hello World!"
 # channel.basic_publish(exchange="", routing_key="hello", body=message)
 channel.basic_publish(
     exchange="",
@@ -1,10 +1,35 @@
-import pika
+import argparse
+import functools
 import sys
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
 
-def main():
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
+
+def do_work(body):
+    print(" [x] Received %r" % body.decode())
+    time.sleep( body.count(b'.') )
+    print(" [x] Done")
+
+
+def positive_int(text):
+    # prefetch_count=0 means no limit: a serial worker would be handed the
+    # whole queue, so 0 and below are refused
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, got %d" % value)
+    return value
+
+
+def main(concurrency=1):
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1, got %r" % concurrency)
     connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
     channel = connection.channel()
 
@@ -17,22 +42,67 @@ def main():
     #     print(" [x] Done")
 
     def callback(ch, method, properties, body):
-        print(" [x] Received %r" % body.decode())
-        time.sleep( body.count(b'.') )
-        print(" [x] Done")
+        do_work(body)
         ch.basic_ack(delivery_tag = method.delivery_tag)
 
+    # run up to `concurrency` tasks at once on a thread pool, the broker
+    # never sends more unacked messages than that (prefetch_count)
+    pool = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+    in_flight = set()
+
+    def ack(future, delivery_tag):
+        in_flight.discard(future)
+        if future.exception() is None:
+            channel.basic_ack(delivery_tag=delivery_tag)
+        else:
+            print(" [!] Task failed: %r" % future.exception())
+            channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+
+    def concurrent_callback(ch, method, properties, body):
+        future = pool.submit(do_work, body)
+        in_flight.add(future)
+
+        def done(future):
+            # called on a pool thread, but a pika channel may only be used
+            # from the connection's thread, so schedule the ack over there
+            connection.add_callback_threadsafe(
+                functools.partial(ack, future, method.delivery_tag)
+            )
+
+        future.add_done_callback(done)
+
     # channel.basic_consume(queue="hello", auto_ack=True, on_message_callback=callback)
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue="task_queue", on_message_callback=callback)
+    channel.basic_qos(prefetch_count=concurrency)
+    channel.basic_consume(
+        queue="task_queue",
+        on_message_callback=concurrent_callback if pool else callback,
+    )
 
     print(" [*] Waiting for messages. To exit press CTRL+C")
-    channel.start_consuming()
+    try:
+        channel.start_consuming()
+    except KeyboardInterrupt:
+        if pool is None:
+            raise
+        # graceful shutdown: stop taking new tasks, let the ones already
+        # running finish and ack them before closing the connection
+        print(" [*] Draining %d in-flight tasks" % len(in_flight))
+        channel.stop_consuming()
+        while in_flight:
+            connection.process_data_events(time_limit=0.1)
+        pool.shutdown()
+        connection.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work queue worker")
+    parser.add_argument(
+        "-c", "--concurrency", type=positive_int, default=1,
+        help="number of tasks to run at the same time (default: 1)",
+    )
+    args = parser.parse_args()
     try:
-        main()
+        main(args.concurrency)
     except KeyboardInterrupt:
         print("Interrupted")
         try:
@@ -1,6 +1,12 @@
-import pika
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
 connection = pika.BlockingConnection(
 	pika.ConnectionParameters(host='localhost')
 )
@@ -10,6 +16,38 @@ channel = connection.channel()
 # publishing to a non-existing exchange is forbidden
 channel.exchange_declare(exchange='logs', exchange_type="fanout")
 
+if "--batch" in sys.argv[1:]:
+	# stream log lines from stdin, many lines per message (see log_frames.py)
+	import select
+
+	from log_frames import BatchingEmitter
+
+	fd = sys.stdin.fileno()
+	pending = b""
+	with BatchingEmitter(channel, exchange='logs') as emitter:
+		while True:
+			# `for line in sys.stdin` blocks until the next line: a quiet
+			# `tail -f` would hold a batch back for ever and let the
+			# connection miss its heartbeats. Wait at most until the batch
+			# is due, then flush it and let pika do its I/O.
+			ready, _, _ = select.select([fd], [], [], emitter.timeout())
+			if ready:
+				# os.read, not sys.stdin: its buffer hides lines from select
+				data = os.read(fd, 64 * 1024)
+				if not data:
+					break
+				*lines, pending = (pending + data).split(b"\n")
+				for line in lines:
+					emitter.emit(line)
+			emitter.poll()
+			connection.process_data_events(time_limit=0)
+		if pending:
+			emitter.emit(pending)
+	print(" [x] Sent %d lines in %d messages (%d bytes)"
+		% (emitter.lines_sent, emitter.messages_sent, emitter.bytes_sent))
+	connection.close()
+	sys.exit(0)
+
 message = ''.join(sys.argv[1:]) or "Info: Hello World"
 
 # publish the messsage to exchange without specifing any queue 
@@ -1,4 +1,12 @@
-import pika
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+from log_frames import is_frame, iter_lines
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
 
 connection = pika.BlockingConnection(pika.ConnectionParameters(host="localhost"))
 channel = connection.channel()
@@ -15,7 +23,16 @@ print(" [*] Waiting for logs. To exit press CTRL+C")
 
 
 def callback(ch, method, properties, body):
-    print(" [x] %r" % body)
+    # batches from `emit_log.py --batch` carry many lines in one message
+    if is_frame(properties):
+        try:
+            for line in iter_lines(body):
+                print(" [x] %r" % bytes(line))
+        except ValueError as e:
+            # a bad message must not kill the consumer
+            print(" [!] dropped log batch of %d bytes: %s" % (len(body), e))
+    else:
+        print(" [x] %r" % body)
 
 # bind consumer to queue
 channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=True)
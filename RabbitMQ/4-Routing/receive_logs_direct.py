@@ -1,6 +1,12 @@
-import pika
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
 connection = pika.BlockingConnection(
 	pika.ConnectionParameters(host='localhost')
 )
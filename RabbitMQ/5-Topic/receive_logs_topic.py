@@ -1,6 +1,13 @@
-import pika
+import os
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+from topic_matcher import TopicMatcher
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
 connection = pika.BlockingConnection(pika.ConnectionParameters(host="localhost"))
 channel = connection.channel()
 
@@ -10,21 +17,33 @@ channel.exchange_declare(exchange="topic_logs", exchange_type="topic")
 result = channel.queue_declare("", exclusive=True)
 queue_name = result.method.queue
 
+# --client-filter: bind once with '#' and match the binding keys here instead
+# of making the broker keep (thousands of) bindings for this queue
+client_filter = "--client-filter" in sys.argv[1:]
+
 # get the binding key which is the (. seperated )topic name
-binding_keys = sys.argv[1:]
+binding_keys = [arg for arg in sys.argv[1:] if arg != "--client-filter"]
 if not binding_keys:
-    sys.stderr.write("Usage: %s [binding_key]...\n" % sys.argv[0])
+    sys.stderr.write("Usage: %s [--client-filter] [binding_key]...\n" % sys.argv[0])
     sys.exit(1)
 
-# make queue bind to a particular topic (provided it as routing_key)
+matcher = TopicMatcher()
 for binding_key in binding_keys:
+    matcher.add(binding_key)
+
+# make queue bind to a particular topic (provided it as routing_key)
+for binding_key in ["#"] if client_filter else binding_keys:
     channel.queue_bind(exchange="topic_logs", queue=queue_name, routing_key=binding_key)
 
 print(" [*] Waiting for logs. To exit press CTRL+C")
 
 
 def callback(ch, method, properties, body):
-    print(" [x] %r:%r" % (method.routing_key, body))
+    # the binding keys that routed this message here
+    matched = matcher.match(method.routing_key)
+    if not matched:
+        return  # only happens with --client-filter
+    print(" [x] %r:%r (%s)" % (method.routing_key, body, ", ".join(sorted(matched))))
 
 
 channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=True)
@@ -0,0 +1,83 @@
+"""
+Compare the trie based TopicMatcher with linear regex matching.
+
+BINDINGS random binding keys (with '*' and '#') are matched against KEYS
+random routing keys. The linear matcher tries one compiled regex per
+binding, so it is timed on a sample of LINEAR_SAMPLE keys and its rate is
+extrapolated: 1M keys x 10k regexes would take hours.
+
+    python topic_benchmark.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from topic_matcher import TopicMatcher, topic_regex
+
+BINDINGS = 10_000
+KEYS = 1_000_000
+LINEAR_SAMPLE = 200
+
+FACILITIES = [f"svc{i}" for i in range(50)]
+SEVERITIES = ["debug", "info", "warning", "error", "critical"]
+HOSTS = [f"host{i}" for i in range(200)]
+
+
+def random_binding(rng):
+    words = [rng.choice(FACILITIES), rng.choice(SEVERITIES), rng.choice(HOSTS)]
+    for i in range(len(words)):
+        r = rng.random()
+        if r < 0.2:
+            words[i] = "*"
+        elif r < 0.25:
+            words[i] = "#"
+    return ".".join(words)
+
+
+def random_routing_key(rng):
+    return ".".join([rng.choice(FACILITIES), rng.choice(SEVERITIES), rng.choice(HOSTS)])
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    bindings = set()
+    while len(bindings) < BINDINGS:
+        bindings.add(random_binding(rng))
+    bindings = sorted(bindings)
+    keys = [random_routing_key(rng) for _ in range(KEYS)]
+    print(f"{len(bindings)} bindings, {len(keys)} routing keys")
+
+    start = time.perf_counter()
+    regexes = [(binding, topic_regex(binding)) for binding in bindings]
+    linear_compile = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = TopicMatcher(cache_size=0)
+    for binding in bindings:
+        matcher.add(binding)
+    trie_compile = time.perf_counter() - start
+
+    sample = keys[:LINEAR_SAMPLE]
+    start = time.perf_counter()
+    linear_results = [
+        {binding for binding, regex in regexes if regex.match("." + key)} for key in sample
+    ]
+    linear_rate = len(sample) / (time.perf_counter() - start)
+
+    assert linear_results == [set(matcher.match(key)) for key in sample]
+
+    start = time.perf_counter()
+    matched = sum(len(matcher.match(key)) for key in keys)
+    trie_rate = len(keys) / (time.perf_counter() - start)
+
+    print(f"{'matcher':<16}{'build':>10}{'keys/sec':>14}{'1M keys':>12}")
+    for name, build, rate in (
+        ("linear regex", linear_compile, linear_rate),
+        ("trie", trie_compile, trie_rate),
+    ):
+        print(f"{name:<16}{build:>9.3f}s{rate:>14,.0f}{1_000_000 / rate:>11.1f}s")
+    print(f"{matched / len(keys):.1f} matching bindings per key, "
+          f"trie is {trie_rate / linear_rate:,.0f}x faster than linear")
@@ -0,0 +1,223 @@
+"""
+asyncio version of FibonacciRpcClient.
+
+`pika.BlockingConnection` can not be awaited, calling it from a coroutine
+stalls the whole event loop. This client uses pika's `AsyncioConnection`
+instead, so every callback runs on the event loop, and keeps a table of
+in-flight requests (correlation_id -> asyncio.Future). Any number of
+coroutines can `await client.call(n)` concurrently over one connection and
+one exclusive reply queue.
+
+The client only needs a pika style asynchronous channel (`queue_declare`,
+`basic_consume` and `basic_publish` taking callbacks), so it can be run
+against the in-process stand-in at the bottom of this file:
+
+    python async_rpc_client.py            # talk to RabbitMQ on localhost
+    python async_rpc_client.py --local    # no RabbitMQ server needed
+"""
+
+import asyncio
+import sys
+import uuid
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+from fib_engine import (
+    DEFAULT_MAX_N, allow_int_digits, decode_reply, encode_error, encode_reply, max_digits,
+)
+
+
+async def open_pika_channel(parameters=None):
+    """Open an AsyncioConnection and a channel on it, without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    opened = loop.create_future()
+
+    def on_open_error(connection, error):
+        if not opened.done():
+            opened.set_exception(ConnectionError(repr(error)))
+
+    def on_closed(connection_or_channel, reason):
+        # closed before the channel was open, don't leave the caller waiting
+        if not opened.done():
+            opened.set_exception(ConnectionError(repr(reason)))
+
+    def on_channel_open(channel):
+        if not opened.done():
+            opened.set_result(channel)
+
+    def on_connection_open(connection):
+        channel = connection.channel(on_open_callback=on_channel_open)
+        channel.add_on_close_callback(on_closed)
+
+    AsyncioConnection(
+        parameters or pika.ConnectionParameters(host="localhost"),
+        on_open_callback=on_connection_open,
+        on_open_error_callback=on_open_error,
+        on_close_callback=on_closed,
+        custom_ioloop=loop,
+    )
+    return await opened
+
+
+class AsyncFibonacciRpcClient:
+    def __init__(self, open_channel=open_pika_channel, routing_key="rpc_queue",
+                 max_n=DEFAULT_MAX_N):
+        self.open_channel = open_channel
+        self.routing_key = routing_key
+        # largest n whose reply is accepted, see FibonacciRpcClient
+        self.max_n = max_n
+        allow_int_digits(max_digits(max_n))
+        self.channel = None
+        self.callback_queue = None
+        # requests in flight: correlation_id -> asyncio.Future
+        self.pending = {}
+        self.declared = None
+        self.closed_reason = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.channel = await self.open_channel()
+        # the channel is closed too when the connection drops
+        self.channel.add_on_close_callback(self.on_channel_closed)
+
+        self.declared = loop.create_future()
+        self.channel.queue_declare(
+            queue="", exclusive=True, callback=self.declared.set_result
+        )
+        self.callback_queue = (await self.declared).method.queue
+
+        self.channel.basic_consume(
+            queue=self.callback_queue,
+            on_message_callback=self.on_response,
+            auto_ack=True,
+        )
+        return self
+
+    def on_response(self, ch, method, props, body):
+        future = self.pending.pop(props.correlation_id, None)
+        # unknown ids are duplicates or replies to requests that timed out
+        if future is not None and not future.done():
+            try:
+                future.set_result(decode_reply(body, self.max_n))
+            except ValueError as e:     # the server refused the request
+                future.set_exception(e)
+
+    def on_channel_closed(self, channel, reason):
+        # no reply will come any more: fail every request in flight instead
+        # of leaving its awaiter hanging (timeout=None waits for ever)
+        self.closed_reason = reason
+        error = ConnectionError(f"RPC channel closed: {reason!r}")
+        if self.declared is not None and not self.declared.done():
+            self.declared.set_exception(error)
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+
+    async def call(self, n, timeout=None):
+        if self.closed_reason is not None:
+            raise ConnectionError(f"RPC channel closed: {self.closed_reason!r}")
+        corr_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self.pending[corr_id] = future
+        try:
+            self.channel.basic_publish(
+                exchange="",
+                routing_key=self.routing_key,
+                properties=pika.BasicProperties(
+                    reply_to=self.callback_queue,
+                    correlation_id=corr_id,
+                ),
+                body=str(n),
+            )
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            # on timeout or cancellation forget the request, a late reply
+            # is then dropped by on_response
+            self.pending.pop(corr_id, None)
+
+    async def close(self):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("RPC client closed"))
+        self.pending.clear()
+        if self.channel is not None and self.channel.is_open:
+            self.channel.close()
+            if self.channel.connection is not None:
+                self.channel.connection.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+# ---------------- in-process stand-in ----------------
+
+
+class LoopbackRpcChannel:
+    """
+        Minimal stand-in for a pika asynchronous channel with an RPC server
+        behind `rpc_queue`. Requests are answered from the event loop like
+        pika would, so the client can be exercised without RabbitMQ.
+    """
+
+    def __init__(self, handler, connection=None):
+        self.handler = handler
+        self.connection = connection
+        self.is_open = True
+        self.consumers = {}
+        self.close_callbacks = []
+
+    def add_on_close_callback(self, callback):
+        self.close_callbacks.append(callback)
+
+    def queue_declare(self, queue, exclusive=False, callback=None):
+        name = queue or f"amq.gen-{uuid.uuid4()}"
+        frame = pika.frame.Method(1, pika.spec.Queue.DeclareOk(queue=name))
+        asyncio.get_running_loop().call_soon(callback, frame)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False):
+        self.consumers[queue] = on_message_callback
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        loop = asyncio.get_running_loop()
+        try:
+            response = encode_reply(self.handler(int(body)))
+        except ValueError as e:
+            response = encode_error(e)
+        reply = pika.BasicProperties(correlation_id=properties.correlation_id)
+        callback = self.consumers[properties.reply_to]
+        loop.call_soon(callback, self, None, reply, response.encode())
+
+    def close(self, reason="closed by client"):
+        self.is_open = False
+        for callback in self.close_callbacks:
+            callback(self, reason)
+
+
+async def main(local):
+    if local:
+        from fib_engine import FibEngine
+
+        fib = FibEngine()
+
+        async def open_channel():
+            return LoopbackRpcChannel(fib)
+    else:
+        open_channel = open_pika_channel
+
+    async with AsyncFibonacciRpcClient(open_channel) as client:
+        print(" [x] Requesting fib(30)")
+        print(" [.] Got %r" % await client.call(30, timeout=5))
+
+        ns = range(1000)
+        print(f" [x] Requesting fib(0..{len(ns) - 1}) concurrently")
+        results = await asyncio.gather(*(client.call(n, timeout=30) for n in ns))
+        print(" [.] Got %d results, fib(999) has %d digits" % (len(results), len(str(results[-1]))))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(local="--local" in sys.argv[1:]))
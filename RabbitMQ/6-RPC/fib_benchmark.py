@@ -0,0 +1,63 @@
+"""
+Micro-benchmark of `rpc_server.on_request` latency for n = 10 .. 10_000.
+
+No broker is needed: `on_request` is driven with a channel that only records
+what would have been published, so the numbers are the server-side cost of
+one request (parse, compute, stringify, publish, ack).
+
+    python fib_benchmark.py
+"""
+
+import contextlib
+import os
+import time
+from types import SimpleNamespace
+
+import rpc_server
+from fib_engine import FibEngine
+
+NS = (10, 100, 1_000, 10_000)
+REPEAT = 200
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.published = 0
+        self.acked = 0
+
+    def basic_publish(self, exchange, routing_key, properties, body):
+        self.published += 1
+
+    def basic_ack(self, delivery_tag):
+        self.acked += 1
+
+
+def request_latency(n, repeat=REPEAT):
+    """Return the mean on_request latency in microseconds."""
+    ch = RecordingChannel()
+    method = SimpleNamespace(delivery_tag=1)
+    props = SimpleNamespace(reply_to="amq.gen-bench", correlation_id="bench")
+    body = str(n).encode()
+
+    # on_request prints one line per request, keep that out of the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            rpc_server.on_request(ch, method, props, body)
+        elapsed = time.perf_counter() - start
+    return elapsed / repeat * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'engine':<22}" + "".join(f"{'n=' + str(n):>14}" for n in NS))
+    for name in ("iterative", "fast_doubling"):
+        for cache_size in (0, 1024):
+            rpc_server.fib = FibEngine(name, cache_size=cache_size)
+            label = name + (" +cache" if cache_size else "")
+            row = "".join(f"{request_latency(n):>12.1f}us" for n in NS)
+            print(f"{label:<22}{row}")
+
+    # the original recursion only for n where it finishes in reasonable time
+    rpc_server.fib = FibEngine("recursive", cache_size=0)
+    print(f"{'recursive':<22}{request_latency(10, repeat=20):>12.1f}us"
+          f"  (n=25: {request_latency(25, repeat=1):.0f}us)")
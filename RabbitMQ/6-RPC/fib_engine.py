@@ -0,0 +1,177 @@
+"""
+Fibonacci compute engines used by the RPC server.
+
+The tutorial version of `fib` uses naive double recursion, which is O(phi^n):
+a single request for n ~ 35 keeps a core busy for seconds and every other
+request waits behind it in `rpc_queue`. The engines below are O(n) or
+O(log n) big-int algorithms, and `FibEngine` puts a bounded LRU cache of
+results in front of whichever one is plugged in.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+# F(n) has about 0.209 * n decimal digits. Python 3.11+ refuses to convert
+# ints of more than 4300 digits to or from str by default, and a huge n
+# would keep a worker busy for good, so requests above max_n are refused.
+DEFAULT_MAX_N = 20_000
+DIGITS_PER_N = 0.20898764
+
+# replies are the decimal result, or this prefix and the reason it failed
+ERROR_PREFIX = "error: "
+
+
+def allow_int_digits(digits):
+    """Raise Python's int <-> str digit limit (3.11+) to at least `digits`."""
+    limit = getattr(sys, "get_int_max_str_digits", lambda: 0)()
+    if limit and digits > limit:
+        sys.set_int_max_str_digits(digits)
+
+
+def max_digits(max_n):
+    """Upper bound on the number of decimal digits of F(n) for n <= max_n."""
+    return int(max_n * DIGITS_PER_N) + 10
+
+
+def encode_reply(value):
+    return str(value)
+
+
+def encode_error(error):
+    return ERROR_PREFIX + str(error)
+
+
+def decode_reply(body, max_n=DEFAULT_MAX_N):
+    """
+    Return the result in a reply body, or raise ValueError with the server's
+    error, or when the reply is longer than F(max_n) can be.
+
+    The caller sets the digit limit once, with allow_int_digits(max_digits(max_n)):
+    the size of a reply is up to whoever sent it, it must not move the limit.
+    """
+    if isinstance(body, bytes):
+        body = body.decode()
+    if body.startswith(ERROR_PREFIX):
+        raise ValueError(body[len(ERROR_PREFIX):])
+    if len(body) > max_digits(max_n):
+        raise ValueError(f"reply of {len(body)} characters is larger than fib({max_n})")
+    return int(body)
+
+
+def fib_recursive(n):
+    """The original exponential implementation, kept for comparison."""
+    if n == 0:
+        return 0
+    elif n == 1:
+        return 1
+    else:
+        return fib_recursive(n - 1) + fib_recursive(n - 2)
+
+
+def fib_iterative(n):
+    """O(n) additions on Python big ints."""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def fib_fast_doubling(n):
+    """
+    O(log n) multiplications using the fast doubling identities
+
+        F(2k)   = F(k) * (2 * F(k+1) - F(k))
+        F(2k+1) = F(k)^2 + F(k+1)^2
+
+    walking the bits of n from the most significant one.
+    """
+    a, b = 0, 1  # F(k), F(k+1) with k = 0
+    for bit in bin(n)[2:]:
+        c = a * ((b << 1) - a)
+        d = a * a + b * b
+        if bit == "1":
+            a, b = d, c + d
+        else:
+            a, b = c, d
+    return a
+
+
+# engines that can be plugged into FibEngine (and picked by name)
+ENGINES = {
+    "recursive": fib_recursive,
+    "iterative": fib_iterative,
+    "fast_doubling": fib_fast_doubling,
+}
+
+
+class FibEngine:
+    """
+    Wrap a fibonacci function with input validation and a bounded,
+    thread-safe LRU cache of results shared by every request it serves.
+    """
+
+    def __init__(self, compute=fib_fast_doubling, cache_size=1024, max_n=DEFAULT_MAX_N):
+        if isinstance(compute, str):
+            compute = ENGINES[compute]
+        self.compute = compute
+        self.cache_size = cache_size
+        self.max_n = max_n
+        # replies for n up to max_n must fit str()
+        allow_int_digits(max_digits(max_n))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, n):
+        """Return n if it is a valid request, raise ValueError otherwise."""
+        if not isinstance(n, int) or isinstance(n, bool):
+            raise ValueError(f"n must be an int, not {type(n).__name__}")
+        if n < 0:
+            raise ValueError(f"fib is not defined for negative n ({n})")
+        if n > self.max_n:
+            raise ValueError(f"n={n} is above the limit of this server ({self.max_n})")
+        return n
+
+    def fib(self, n):
+        self.check(n)
+
+        with self._lock:
+            if n in self._cache:
+                self._cache.move_to_end(n)
+                self.hits += 1
+                return self._cache[n]
+            self.misses += 1
+
+        # compute outside the lock so a big n does not block cache hits
+        value = self.compute(n)
+
+        if self.cache_size:
+            with self._lock:
+                self._cache[n] = value
+                self._cache.move_to_end(n)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    __call__ = fib
+
+    def cache_clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+if __name__ == "__main__":
+    engine = FibEngine()
+    for n in (0, 1, 2, 10, 30, 100):
+        assert engine(n) == fib_iterative(n)
+        print(f"fib({n}) = {engine(n)}")
+    print(f"hits={engine.hits} misses={engine.misses}")
+    for n in (-1, DEFAULT_MAX_N + 1, 10**10):
+        try:
+            engine(n)
+        except ValueError as e:
+            print(f"fib({n}) refused: {e}")
+    assert decode_reply(encode_reply(engine(DEFAULT_MAX_N))) == engine(DEFAULT_MAX_N)
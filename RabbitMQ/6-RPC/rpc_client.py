@@ -1,9 +1,25 @@
-import pika
+import os
+import sys
+import time
 import uuid
+from concurrent.futures import Future
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
+
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
+
+from fib_engine import DEFAULT_MAX_N, allow_int_digits, decode_reply, max_digits
 
 
 class FibonacciRpcClient(object):
-    def __init__(self):
+    def __init__(self, max_n=DEFAULT_MAX_N):
+        # largest n whose reply is accepted, set the int <-> str digit limit
+        # for it once instead of trusting the size of what arrives
+        self.max_n = max_n
+        allow_int_digits(max_digits(max_n))
+
         self.connection = pika.BlockingConnection(
             pika.ConnectionParameters(host="localhost")
         )
@@ -18,30 +34,83 @@ class FibonacciRpcClient(object):
             auto_ack=True,
         )
 
+        # requests in flight: correlation_id -> (future, deadline or None)
+        self.pending = {}
+
     def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
+        # replies can arrive in any order, the correlation_id tells us which
+        # request it answers. Unknown ids (duplicates, timed out) are dropped.
+        entry = self.pending.pop(props.correlation_id, None)
+        if entry is not None:
+            future, _ = entry
+            try:
+                future.set_result(decode_reply(body, self.max_n))
+            except ValueError as e:     # the server refused the request
+                future.set_exception(e)
 
-    def call(self, n):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
+    def call_async(self, n, timeout=None):
+        """
+            Publish a request and return a Future for its result without
+            waiting. The future is resolved while `wait` pumps the connection.
+        """
+        corr_id = str(uuid.uuid4())
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self.pending[corr_id] = (future, deadline)
         self.channel.basic_publish(
             exchange="",
             routing_key="rpc_queue",
             properties=pika.BasicProperties(
                 reply_to=self.callback_queue,
-                correlation_id=self.corr_id,
+                correlation_id=corr_id,
             ),
             body=str(n),
         )
-        while self.response is None:
-            self.connection.process_data_events()
-        return int(self.response)
+        return future
+
+    def wait(self, futures):
+        """
+            Process replies until every future is done. Requests whose
+            deadline passed are failed with TimeoutError.
+        """
+        while not all(future.done() for future in futures):
+            now = time.monotonic()
+            next_deadline = None
+            for corr_id, (future, deadline) in list(self.pending.items()):
+                if deadline is None:
+                    continue
+                if deadline <= now:
+                    del self.pending[corr_id]
+                    future.set_exception(TimeoutError("RPC request timed out"))
+                elif next_deadline is None or deadline < next_deadline:
+                    next_deadline = deadline
+            if all(future.done() for future in futures):
+                break
+            time_limit = 1 if next_deadline is None else min(1, next_deadline - now)
+            self.connection.process_data_events(time_limit=time_limit)
+        return futures
+
+    def call_many(self, ns, timeout=None):
+        """
+            Pipeline many requests: publish them all up front, then collect
+            the replies as they arrive. Returns results in the order of `ns`.
+        """
+        futures = [self.call_async(n, timeout) for n in ns]
+        self.wait(futures)
+        return [future.result() for future in futures]
+
+    def call(self, n, timeout=None):
+        return self.call_many([n], timeout)[0]
+
 
+if __name__ == "__main__":
+    fibonacci_rpc = FibonacciRpcClient()
 
-fibonacci_rpc = FibonacciRpcClient()
+    input_int = int(input("Enter number: "))
+    print(f" [x] Requesting fib({input_int})")
+    response = fibonacci_rpc.call(input_int)
+    print(" [.] Got %r" % response)
 
-input_int = int(input("Enter number < 30: "))
-print(f" [x] Requesting fib({input_int})")
-response = fibonacci_rpc.call(input_int)
-print(" [.] Got %r" % response)
+    print(f" [x] Requesting fib(0..{input_int}) pipelined")
+    responses = fibonacci_rpc.call_many(range(input_int + 1), timeout=30)
+    print(" [.] Got %r" % responses)
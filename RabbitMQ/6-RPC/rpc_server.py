@@ -1,37 +1,188 @@
-import pika
+import argparse
+import functools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-connection = pika.BlockingConnection(pika.ConnectionParameters(host="localhost"))
-channel = connection.channel()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from local_broker import select_pika
 
-# declare RPC queue
-channel.queue_declare(queue="rpc_queue")
+# real pika, or the in-process broker when RABBITMQ_BROKER=local
+pika = select_pika()
 
+from fib_engine import DEFAULT_MAX_N, ENGINES, FibEngine, encode_error, encode_reply
 
-def fib(n):
-    if n == 0:
-        return 0
-    elif n == 1:
-        return 1
-    else:
-        return fib(n - 1) + fib(n - 2)
+# fast doubling + bounded result cache, answers fib(10_000) in microseconds
+# instead of the exponential recursion the tutorial started with.
+# Pass a different compute function (see fib_engine.ENGINES) to swap it.
+fib = FibEngine("fast_doubling", cache_size=1024)
 
+# print a line for every request
+verbose = True
 
-def on_request(ch, method, props, body):
-    n = int(body)
 
-    print(" [.] fib(%s)" % n)
-    response = fib(n)
+def set_engine(name, cache_size=1024, max_n=DEFAULT_MAX_N):
+    global fib
+    fib = FibEngine(name, cache_size, max_n)
+
+
+def compute(n):
+    # module level so a process pool can pickle it by reference
+    return fib(n)
 
+
+def reply(ch, method, props, body):
     ch.basic_publish(
         exchange="",
         routing_key=props.reply_to,
         properties=pika.BasicProperties(correlation_id=props.correlation_id),
-        body=str(response),
+        body=body,
     )
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
-channel.basic_qos(prefetch_count=1)
-channel.basic_consume(queue='rpc_queue', on_message_callback=on_request)
 
-print(" [x] Awaiting RPC requests")
-channel.start_consuming()
+def parse_request(body):
+    # int() raises ValueError for garbage and, on 3.11+, for huge numbers
+    return fib.check(int(body))
+
+
+def reject(ch, method, props, body, error):
+    # answer with the reason instead of letting the exception kill the
+    # connection, so the client doesn't wait for a reply that never comes
+    if verbose:
+        print(" [!] bad request %r: %s" % (body[:40], error))
+    reply(ch, method, props, encode_error(error))
+
+
+def on_request(ch, method, props, body):
+    try:
+        n = parse_request(body)
+    except ValueError as e:
+        reject(ch, method, props, body, e)
+        return
+
+    if verbose:
+        print(" [.] fib(%s)" % n)
+    response = fib(n)
+
+    reply(ch, method, props, encode_reply(response))
+
+
+class PooledBackend:
+    """
+        Hands the computation to a process pool and returns at once, so the
+        connection thread keeps serving heartbeats and deliveries while the
+        workers compute.
+
+        Every request gets a reply: when the computation fails, or the pool
+        can't take it, the client receives an error instead of waiting for
+        ever. A broken pool (a worker killed by a signal or the OOM killer)
+        is replaced by a fresh one.
+    """
+
+    def __init__(self, connection, make_pool):
+        self.connection = connection
+        self.make_pool = make_pool
+        self.pool = make_pool()
+
+    def restart(self, broken):
+        # connection thread only. Every request in flight on the broken pool
+        # fails, the first one to get here replaces it
+        if self.pool is broken:
+            print(" [!] process pool broken, starting a new one")
+            broken.shutdown(wait=False)
+            self.pool = self.make_pool()
+
+    def submit(self, n):
+        try:
+            return self.pool.submit(compute, n)
+        except BrokenProcessPool:
+            # broke while idle, nothing computed this request yet: retry once
+            self.restart(self.pool)
+            return self.pool.submit(compute, n)
+
+    def on_request(self, ch, method, props, body):
+        try:
+            n = parse_request(body)
+        except ValueError as e:
+            reject(ch, method, props, body, e)
+            return
+        if verbose:
+            print(" [.] fib(%s)" % n)
+
+        try:
+            future = self.submit(n)
+        except Exception as e:
+            print(" [!] fib(%s) not submitted: %r" % (n, e))
+            reply(ch, method, props, encode_error(e))
+            return
+        pool = self.pool
+
+        def done(future):
+            # runs in an executor thread, pika channels are not thread safe
+            # so publish and ack from the connection thread instead
+            try:
+                callback = functools.partial(reply, ch, method, props, encode_reply(future.result()))
+            except ValueError as e:
+                callback = functools.partial(reject, ch, method, props, body, e)
+            except Exception as e:
+                print(" [!] fib(%s) failed: %r" % (n, e))
+                callback = functools.partial(reply, ch, method, props, encode_error(e))
+                if isinstance(e, BrokenProcessPool):
+                    self.connection.add_callback_threadsafe(functools.partial(self.restart, pool))
+            self.connection.add_callback_threadsafe(callback)
+
+        future.add_done_callback(done)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fibonacci RPC server")
+    parser.add_argument(
+        "--workers", type=int, default=0,
+        help="compute in a pool of N processes (default: in the pika callback)",
+    )
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="fast_doubling")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="results kept in the LRU cache (0 disables it)")
+    parser.add_argument("--max-n", type=int, default=DEFAULT_MAX_N,
+                        help="refuse requests for larger n (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="don't log every request")
+    args = parser.parse_args(argv)
+
+    global verbose
+    verbose = not args.quiet
+    set_engine(args.engine, args.cache_size, args.max_n)
+
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host="localhost"))
+    channel = connection.channel()
+
+    # declare RPC queue
+    channel.queue_declare(queue="rpc_queue")
+
+    if args.workers:
+        backend = PooledBackend(connection, functools.partial(
+            ProcessPoolExecutor, args.workers, initializer=set_engine,
+            initargs=(args.engine, args.cache_size, args.max_n),
+        ))
+        # one unacked request per worker keeps every process busy
+        channel.basic_qos(prefetch_count=args.workers)
+        channel.basic_consume(queue="rpc_queue", on_message_callback=backend.on_request)
+    else:
+        backend = None
+        channel.basic_qos(prefetch_count=1)
+        channel.basic_consume(queue='rpc_queue', on_message_callback=on_request)
+
+    print(" [x] Awaiting RPC requests")
+    try:
+        channel.start_consuming()
+    finally:
+        if backend is not None:
+            backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
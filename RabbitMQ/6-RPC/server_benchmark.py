@@ -0,0 +1,84 @@
+"""
+Compare the single-threaded RPC server loop with the process pool backend.
+
+For every server mode a fresh `rpc_server.py` is started, then 1, 4 and 16
+clients (one thread and one connection each) send back to back requests for
+DURATION seconds. The default workload is the CPU-bound recursive engine at
+n = 25 with the result cache off, where a single core is the bottleneck.
+
+Needs RabbitMQ on localhost, or runs everything in this process against
+the in-process broker:
+
+    python server_benchmark.py
+    RABBITMQ_BROKER=local python server_benchmark.py
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import rpc_server
+from local_broker import BROKER
+from rpc_client import FibonacciRpcClient
+
+LOCAL = os.environ.get("RABBITMQ_BROKER") == "local"
+
+ENGINE = "recursive"
+N = 25
+DURATION = 5
+CLIENTS = (1, 4, 16)
+MODES = {
+    "single-threaded": [],
+    "pool x4": ["--workers", "4"],
+}
+
+
+def client_loop(stop, counts, index):
+    client = FibonacciRpcClient()
+    while not stop.is_set():
+        client.call(N, timeout=60)
+        counts[index] += 1
+    client.connection.close()
+
+
+def run_clients(num_clients):
+    stop = threading.Event()
+    counts = [0] * num_clients
+    threads = [
+        threading.Thread(target=client_loop, args=(stop, counts, i))
+        for i in range(num_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / DURATION
+
+
+if __name__ == "__main__":
+    print(f"fib({N}) with the {ENGINE} engine, requests/sec")
+    print(f"{'server':<18}" + "".join(f"{str(c) + ' clients':>12}" for c in CLIENTS))
+    for name, args in MODES.items():
+        args = ["--engine", ENGINE, "--cache-size", "0", "--quiet", *args]
+        if LOCAL:
+            # the in-memory broker only exists in this process, so run the
+            # server on a thread. Resetting the broker detaches the previous one
+            BROKER.reset()
+            server = None
+            threading.Thread(target=rpc_server.main, args=(args,), daemon=True).start()
+        else:
+            server = subprocess.Popen(
+                [sys.executable, "rpc_server.py", *args], stdout=subprocess.DEVNULL
+            )
+        try:
+            time.sleep(1)  # let it connect and start consuming
+            row = "".join(f"{run_clients(c):>12.1f}" for c in CLIENTS)
+            print(f"{name:<18}{row}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
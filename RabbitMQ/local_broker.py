@@ -0,0 +1,468 @@
+"""
+In-process, in-memory stand-in for a RabbitMQ broker.
+
+It implements the part of pika's `BlockingConnection` API the tutorials use,
+with the same semantics for the features they rely on:
+
+- default exchange plus `direct`, `fanout` and `topic` exchanges
+- named, server named (`queue=""`) and exclusive queues, exclusive queues
+  are private to their connection and deleted when it closes
+- manual acks / nacks / rejects with requeue, `auto_ack` consumers
+- `basic_qos(prefetch_count=...)` limits unacked deliveries per channel
+- round-robin dispatch between the consumers of a queue
+- `add_callback_threadsafe`, `process_data_events`, `start_consuming`
+
+Everything lives in the memory of the current process, so a producer and a
+consumer only meet when they run in the same process (e.g. in two threads).
+That is what the benchmarks need: the client side hot paths (callbacks,
+serialization, ack handling) can be measured on any box without a server.
+
+Every script under RabbitMQ/ gets its pika module from `select_pika()`, so
+setting an environment variable switches it to this broker:
+
+    RABBITMQ_BROKER=local python rpc_server.py
+"""
+
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+import pika
+from pika import BasicProperties, ConnectionParameters  # noqa: F401 (re-exported)
+from pika import exceptions, frame, spec
+
+from topic_matcher import TopicMatcher
+
+
+def select_pika():
+    """
+        Return the module the scripts should use as `pika`: this module when
+        RABBITMQ_BROKER=local is set, the real pika client otherwise.
+    """
+    if os.environ.get("RABBITMQ_BROKER") == "local":
+        return sys.modules[__name__]
+    return pika
+
+
+class _Message:
+    __slots__ = ("exchange", "routing_key", "properties", "body", "redelivered")
+
+    def __init__(self, exchange, routing_key, properties, body):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.properties = properties
+        self.body = body
+        self.redelivered = False
+
+
+class _Consumer:
+    __slots__ = ("tag", "channel", "callback", "auto_ack")
+
+    def __init__(self, tag, channel, callback, auto_ack):
+        self.tag = tag
+        self.channel = channel
+        self.callback = callback
+        self.auto_ack = auto_ack
+
+
+class _Queue:
+    def __init__(self, name, durable=False, exclusive_owner=None):
+        self.name = name
+        self.durable = durable
+        self.exclusive_owner = exclusive_owner
+        self.messages = deque()
+        self.consumers = []
+        self.next_consumer = 0
+
+
+class _Exchange:
+    def __init__(self, name, exchange_type):
+        self.name = name
+        self.type = exchange_type
+        # (queue name, binding key) pairs
+        self.bindings = set()
+        # topic exchanges route through a trie instead of scanning bindings
+        self.topics = TopicMatcher() if exchange_type == "topic" else None
+
+    def bind(self, queue_name, routing_key):
+        self.bindings.add((queue_name, routing_key))
+        if self.topics is not None:
+            self.topics.add(routing_key, queue_name)
+
+    def unbind(self, queue_name, routing_key=None):
+        for key in list(self.bindings):
+            if key[0] == queue_name and (routing_key is None or key[1] == routing_key):
+                self.bindings.discard(key)
+                if self.topics is not None:
+                    self.topics.remove(key[1], queue_name)
+
+    def route(self, routing_key):
+        if self.type == "fanout":
+            return {queue_name for queue_name, _ in self.bindings}
+        if self.type == "direct":
+            return {q for q, key in self.bindings if key == routing_key}
+        if self.type == "topic":
+            return self.topics.match(routing_key)
+        raise exceptions.ChannelClosedByBroker(
+            503, f"COMMAND_INVALID - unknown exchange type '{self.type}'"
+        )
+
+
+class LocalBroker:
+    """Holds the exchanges and queues shared by every connection to it."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.exchanges = {}
+        self.queues = {}
+
+    def reset(self):
+        with self.lock:
+            self.exchanges.clear()
+            self.queues.clear()
+
+    # -- called with self.lock held --
+
+    def _queue(self, name, connection):
+        q = self.queues.get(name)
+        if q is None:
+            raise exceptions.ChannelClosedByBroker(
+                404, f"NOT_FOUND - no queue '{name}' in vhost '/'"
+            )
+        if q.exclusive_owner is not None and q.exclusive_owner is not connection:
+            raise exceptions.ChannelClosedByBroker(
+                405,
+                f"RESOURCE_LOCKED - cannot obtain exclusive access to locked queue '{name}'",
+            )
+        return q
+
+    def _exchange(self, name):
+        exchange = self.exchanges.get(name)
+        if exchange is None:
+            raise exceptions.ChannelClosedByBroker(
+                404, f"NOT_FOUND - no exchange '{name}' in vhost '/'"
+            )
+        return exchange
+
+    def _dispatch(self, q):
+        """Hand queued messages to consumers that have prefetch capacity."""
+        consumers = q.consumers
+        while q.messages and consumers:
+            for _ in range(len(consumers)):
+                consumer = consumers[q.next_consumer % len(consumers)]
+                q.next_consumer += 1
+                if consumer.auto_ack or consumer.channel._has_capacity():
+                    break
+            else:
+                return  # every consumer is at its prefetch limit
+            consumer.channel._deliver(consumer, q, q.messages.popleft())
+
+    def _requeue(self, q, message):
+        message.redelivered = True
+        if q.name in self.queues:
+            q.messages.appendleft(message)
+            self._dispatch(q)
+
+
+# the broker every connection uses unless told otherwise
+BROKER = LocalBroker()
+
+
+class BlockingChannel:
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.is_open = True
+        self.prefetch_count = 0
+        self._delivery_tags = itertools.count(1)
+        self._unacked = {}  # delivery tag -> (queue, message)
+        self._consumers = {}  # consumer tag -> _Consumer
+        self._consuming = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # -- declarations --
+
+    def exchange_declare(self, exchange, exchange_type="direct", **kwargs):
+        with self.broker.lock:
+            current = self.broker.exchanges.get(exchange)
+            if current is None:
+                self.broker.exchanges[exchange] = _Exchange(exchange, exchange_type)
+            elif current.type != exchange_type:
+                raise exceptions.ChannelClosedByBroker(
+                    406,
+                    f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange '{exchange}'",
+                )
+        return frame.Method(self.channel_number, spec.Exchange.DeclareOk())
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        with self.broker.lock:
+            name = queue or f"amq.gen-{uuid.uuid4().hex}"
+            q = self.broker.queues.get(name)
+            if q is None:
+                if passive:
+                    self.broker._queue(name, self.connection)
+                owner = self.connection if exclusive else None
+                q = self.broker.queues[name] = _Queue(name, durable, owner)
+                if owner is not None:
+                    self.connection._exclusive_queues.append(name)
+            else:
+                self.broker._queue(name, self.connection)
+            method = spec.Queue.DeclareOk(
+                queue=name, message_count=len(q.messages), consumer_count=len(q.consumers)
+            )
+        return frame.Method(self.channel_number, method)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        with self.broker.lock:
+            self.broker._queue(queue, self.connection)
+            self.broker._exchange(exchange).bind(
+                queue, queue if routing_key is None else routing_key
+            )
+        return frame.Method(self.channel_number, spec.Queue.BindOk())
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None):
+        with self.broker.lock:
+            self.broker._exchange(exchange).unbind(queue, routing_key)
+        return frame.Method(self.channel_number, spec.Queue.UnbindOk())
+
+    def queue_purge(self, queue):
+        with self.broker.lock:
+            q = self.broker._queue(queue, self.connection)
+            count = len(q.messages)
+            q.messages.clear()
+        return frame.Method(self.channel_number, spec.Queue.PurgeOk(message_count=count))
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False):
+        with self.broker.lock:
+            q = self.broker._queue(queue, self.connection)
+            del self.broker.queues[queue]
+            for exchange in self.broker.exchanges.values():
+                exchange.unbind(queue)
+        return frame.Method(
+            self.channel_number, spec.Queue.DeleteOk(message_count=len(q.messages))
+        )
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        with self.broker.lock:
+            self.prefetch_count = prefetch_count
+            for q in list(self.broker.queues.values()):
+                self.broker._dispatch(q)
+
+    def confirm_delivery(self):
+        # publishes are routed synchronously, there is nothing to confirm
+        pass
+
+    # -- publishing --
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if isinstance(body, str):
+            body = body.encode()
+        if properties is None:
+            properties = BasicProperties()
+        broker = self.broker
+        with broker.lock:
+            if exchange == "":
+                targets = (routing_key,) if routing_key in broker.queues else ()
+            else:
+                targets = broker._exchange(exchange).route(routing_key)
+            if not targets and mandatory:
+                raise exceptions.UnroutableError([])
+            for name in targets:
+                q = broker.queues[name]
+                q.messages.append(_Message(exchange, routing_key, properties, body))
+                broker._dispatch(q)
+
+    # -- consuming --
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False,
+                      exclusive=False, consumer_tag=None, arguments=None):
+        consumer_tag = consumer_tag or f"ctag{self.channel_number}.{uuid.uuid4().hex}"
+        with self.broker.lock:
+            q = self.broker._queue(queue, self.connection)
+            consumer = _Consumer(consumer_tag, self, on_message_callback, auto_ack)
+            q.consumers.append(consumer)
+            self._consumers[consumer_tag] = consumer
+            self.broker._dispatch(q)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        with self.broker.lock:
+            consumer = self._consumers.pop(consumer_tag, None)
+            if consumer is not None:
+                for q in self.broker.queues.values():
+                    if consumer in q.consumers:
+                        q.consumers.remove(consumer)
+        return []
+
+    def basic_get(self, queue, auto_ack=False):
+        with self.broker.lock:
+            q = self.broker._queue(queue, self.connection)
+            if not q.messages:
+                return None, None, None
+            message = q.messages.popleft()
+            tag = next(self._delivery_tags)
+            if not auto_ack:
+                self._unacked[tag] = (q, message)
+        method = spec.Basic.GetOk(
+            delivery_tag=tag, redelivered=message.redelivered, exchange=message.exchange,
+            routing_key=message.routing_key, message_count=len(q.messages),
+        )
+        return method, message.properties, message.body
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._settle(delivery_tag, multiple, requeue=None)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self._settle(delivery_tag, multiple, requeue)
+
+    def basic_reject(self, delivery_tag=0, requeue=True):
+        self._settle(delivery_tag, False, requeue)
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and self._consumers:
+            self.connection.process_data_events(time_limit=None)
+
+    def stop_consuming(self, consumer_tag=None):
+        for tag in [consumer_tag] if consumer_tag else list(self._consumers):
+            self.basic_cancel(tag)
+        self._consuming = False
+
+    def close(self, reply_code=0, reply_text="Normal shutdown"):
+        if not self.is_open:
+            return
+        self.is_open = False
+        with self.broker.lock:
+            for tag in list(self._consumers):
+                self.basic_cancel(tag)
+            unacked, self._unacked = self._unacked, {}
+            for q, message in unacked.values():
+                self.broker._requeue(q, message)
+
+    # -- broker side, called with broker.lock held --
+
+    def _has_capacity(self):
+        return not self.prefetch_count or len(self._unacked) < self.prefetch_count
+
+    def _deliver(self, consumer, q, message):
+        tag = next(self._delivery_tags)
+        if not consumer.auto_ack:
+            self._unacked[tag] = (q, message)
+        self.connection._events.put((self, consumer, tag, q, message))
+
+    def _settle(self, delivery_tag, multiple, requeue):
+        broker = self.broker
+        with broker.lock:
+            if multiple:
+                tags = [tag for tag in self._unacked if tag <= delivery_tag or delivery_tag == 0]
+            elif delivery_tag in self._unacked:
+                tags = [delivery_tag]
+            else:
+                raise exceptions.ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}"
+                )
+            queues = set()
+            for tag in tags:
+                q, message = self._unacked.pop(tag)
+                if requeue:
+                    broker._requeue(q, message)
+                queues.add(q)
+            # capacity freed up on this channel
+            for q in queues:
+                broker._dispatch(q)
+
+
+class BlockingConnection:
+    def __init__(self, parameters=None, broker=None):
+        self.parameters = parameters
+        self.broker = broker or BROKER
+        self.is_open = True
+        self._channels = []
+        self._exclusive_queues = []
+        # deliveries and threadsafe callbacks, consumed on the connection's thread
+        self._events = queue.SimpleQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def channel(self, channel_number=None):
+        channel = BlockingChannel(self, channel_number or len(self._channels) + 1)
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback):
+        self._events.put(callback)
+
+    def process_data_events(self, time_limit=0):
+        """
+            Run pending callbacks. Waits up to `time_limit` seconds (forever
+            for None) for the first one, then drains whatever else is ready.
+        """
+        events = self._events
+        try:
+            if time_limit == 0:
+                event = events.get_nowait()
+            else:
+                event = events.get(timeout=time_limit)
+        except queue.Empty:
+            return
+        while True:
+            self._run(event)
+            try:
+                event = events.get_nowait()
+            except queue.Empty:
+                return
+
+    def _run(self, event):
+        if not isinstance(event, tuple):
+            event()  # add_callback_threadsafe
+            return
+        channel, consumer, tag, q, message = event
+        if consumer.tag not in channel._consumers:
+            # cancelled after the message was handed over, give it back
+            if not consumer.auto_ack:
+                with self.broker.lock:
+                    if channel._unacked.pop(tag, None) is not None:
+                        self.broker._requeue(q, message)
+            return
+        method = spec.Basic.Deliver(
+            consumer_tag=consumer.tag, delivery_tag=tag, redelivered=message.redelivered,
+            exchange=message.exchange, routing_key=message.routing_key,
+        )
+        consumer.callback(channel, method, message.properties, message.body)
+
+    def sleep(self, duration):
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.process_data_events(time_limit=remaining)
+
+    def close(self, reply_code=200, reply_text="Normal shutdown"):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for channel in self._channels:
+            channel.close()
+        with self.broker.lock:
+            # exclusive queues go away with the connection that declared them
+            for name in self._exclusive_queues:
+                self.broker.queues.pop(name, None)
+                for exchange in self.broker.exchanges.values():
+                    exchange.unbind(name)
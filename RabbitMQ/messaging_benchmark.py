@@ -0,0 +1,266 @@
+"""
+Throughput and latency benchmark for the messaging patterns of the tutorials.
+
+Each pattern is driven with configurable message size, producer / consumer
+counts and prefetch. Producers stamp every message with a `sent_ns` header
+and consumers compute the end-to-end latency on arrival, so the report has
+msgs/sec plus p50 / p99 / p99.9 latency:
+
+    hello   send.py / receive.py        default exchange, consumers share a queue
+    work    new_task.py / worker.py     durable queue, persistent messages
+    fanout  emit_log.py / receive_logs.py   every consumer gets every message
+    direct  emit_log_direct.py / receive_logs_direct.py
+    topic   emit_log_topic.py / receive_logs_topic.py
+    rpc     rpc_client.py / rpc_server.py   latency is the client round trip
+
+Producers and consumers are threads of this process with one connection
+each, so by default everything runs against the in-process broker and needs
+no RabbitMQ server (CI friendly). Results are written to a JSON file:
+
+    python messaging_benchmark.py --patterns hello fanout rpc --size 256
+    python messaging_benchmark.py --broker rabbitmq --producers 4 --consumers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+RABBITMQ_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(RABBITMQ_DIR)
+
+PATTERNS = {
+    # exchange, exchange type, queue shared by consumers, binding key, routing key
+    "hello": ("", None, "bench_hello", None, "bench_hello"),
+    "work": ("", None, "bench_task_queue", None, "bench_task_queue"),
+    "fanout": ("bench_logs", "fanout", None, "", ""),
+    "direct": ("bench_direct_logs", "direct", None, "info", "info"),
+    "topic": ("bench_topic_logs", "topic", None, "bench.*.info", "bench.producer.info"),
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Collector:
+    """Latency samples and delivery count shared by the consumer threads."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.lock = threading.Lock()
+        self.latencies_ns = []
+        self.delivered = 0
+        self.done = threading.Event()
+
+    def record(self, samples):
+        with self.lock:
+            self.latencies_ns.extend(samples)
+            self.delivered += len(samples)
+            if self.delivered >= self.expected:
+                self.done.set()
+
+
+def run_pubsub(pika, name, args):
+    exchange, exchange_type, shared_queue, binding_key, routing_key = PATTERNS[name]
+    durable = name == "work"
+    published = args.messages * args.producers
+    # a shared queue splits the messages, otherwise every consumer gets all
+    expected = published if shared_queue else published * args.consumers
+    collector = Collector(expected)
+    ready = threading.Barrier(args.consumers + 1)
+    body = b"x" * args.size
+
+    def connect():
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.host))
+        channel = connection.channel()
+        if exchange_type:
+            channel.exchange_declare(exchange=exchange, exchange_type=exchange_type)
+        return connection, channel
+
+    def consumer():
+        connection, channel = connect()
+        if shared_queue:
+            queue_name = shared_queue
+            channel.queue_declare(queue=queue_name, durable=durable)
+        else:
+            queue_name = channel.queue_declare(queue="", exclusive=True).method.queue
+            channel.queue_bind(exchange=exchange, queue=queue_name, routing_key=binding_key)
+        channel.basic_qos(prefetch_count=args.prefetch)
+
+        samples = []
+
+        def callback(ch, method, properties, body):
+            samples.append(time.perf_counter_ns() - properties.headers["sent_ns"])
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        channel.basic_consume(queue=queue_name, on_message_callback=callback)
+        ready.wait()
+        while not collector.done.is_set():
+            connection.process_data_events(time_limit=0.05)
+            # hand samples over in batches to keep the lock off the hot path
+            if samples:
+                collector.record(samples)
+                samples = []
+        connection.close()
+
+    def producer():
+        connection, channel = connect()
+        if shared_queue:
+            channel.queue_declare(queue=shared_queue, durable=durable)
+        for _ in range(args.messages):
+            channel.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(
+                    headers={"sent_ns": time.perf_counter_ns()},
+                    delivery_mode=2 if durable else None,
+                ),
+            )
+        connection.close()
+
+    consumers = [threading.Thread(target=consumer) for _ in range(args.consumers)]
+    for thread in consumers:
+        thread.start()
+    ready.wait()  # queues are declared and bound before anything is sent
+
+    start = time.perf_counter()
+    producers = [threading.Thread(target=producer) for _ in range(args.producers)]
+    for thread in producers:
+        thread.start()
+    for thread in producers:
+        thread.join()
+    if not collector.done.wait(args.timeout):
+        collector.done.set()  # report what arrived, and let consumers exit
+    elapsed = time.perf_counter() - start
+    for thread in consumers:
+        thread.join()
+    return published, collector, elapsed
+
+
+def run_rpc(pika, args):
+    sys.path.append(os.path.join(RABBITMQ_DIR, "6-RPC"))
+    import rpc_server
+    from rpc_client import FibonacciRpcClient
+
+    rpc_server.verbose = False
+    published = args.messages * args.producers
+    collector = Collector(published)
+    ready = threading.Barrier(args.consumers + 1)
+    stop = threading.Event()
+
+    def server():
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.host))
+        channel = connection.channel()
+        channel.queue_declare(queue="rpc_queue")
+        channel.basic_qos(prefetch_count=args.prefetch)
+        channel.basic_consume(queue="rpc_queue", on_message_callback=rpc_server.on_request)
+        ready.wait()
+        while not stop.is_set():
+            connection.process_data_events(time_limit=0.05)
+        connection.close()
+
+    def client():
+        rpc = FibonacciRpcClient()
+        samples = []
+        for _ in range(args.messages):
+            sent = time.perf_counter_ns()
+            rpc.call(args.size, timeout=args.timeout)
+            samples.append(time.perf_counter_ns() - sent)
+        collector.record(samples)
+        rpc.connection.close()
+
+    servers = [threading.Thread(target=server) for _ in range(args.consumers)]
+    for thread in servers:
+        thread.start()
+    ready.wait()
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(args.producers)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in servers:
+        thread.join()
+    return published, collector, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--patterns", nargs="+", choices=[*PATTERNS, "rpc"],
+                        default=[*PATTERNS, "rpc"])
+    parser.add_argument("--broker", choices=["local", "rabbitmq"], default="local")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--messages", type=int, default=10_000,
+                        help="messages per producer (default: 10000)")
+    parser.add_argument("--size", type=int, default=128,
+                        help="message body size in bytes, fib(n) for rpc (default: 128)")
+    parser.add_argument("--producers", type=int, default=1)
+    parser.add_argument("--consumers", type=int, default=1)
+    parser.add_argument("--prefetch", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    # the RPC scripts pick their pika module from this variable on import
+    if args.broker == "local":
+        os.environ["RABBITMQ_BROKER"] = "local"
+    from local_broker import select_pika
+
+    pika = select_pika()
+
+    results = []
+    for name in args.patterns:
+        if name == "rpc":
+            published, collector, elapsed = run_rpc(pika, args)
+        else:
+            published, collector, elapsed = run_pubsub(pika, name, args)
+
+        latencies = sorted(collector.latencies_ns)
+        result = {
+            "pattern": name,
+            "broker": args.broker,
+            "size": args.size,
+            "producers": args.producers,
+            "consumers": args.consumers,
+            "prefetch": args.prefetch,
+            "published": published,
+            "delivered": collector.delivered,
+            "seconds": elapsed,
+            "msgs_per_sec": collector.delivered / elapsed,
+            "latency_us": {
+                name: (value / 1000 if value is not None else None)
+                for name, value in (
+                    ("p50", percentile(latencies, 0.50)),
+                    ("p99", percentile(latencies, 0.99)),
+                    ("p999", percentile(latencies, 0.999)),
+                    ("max", latencies[-1] if latencies else None),
+                )
+            },
+        }
+        results.append(result)
+        latency = result["latency_us"]
+        print(
+            f"{name:<8}{result['msgs_per_sec']:>12,.0f} msgs/sec"
+            f"   p50 {latency['p50']:>9.1f}us   p99 {latency['p99']:>9.1f}us"
+            f"   p999 {latency['p999']:>9.1f}us"
+            + ("" if collector.delivered == collector.expected
+               else f"   ({collector.delivered}/{collector.expected} delivered)")
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f" [x] Results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Trie based matcher for topic exchange binding keys.
+
+A binding key is a list of words separated by dots, where `*` matches
+exactly one word and `#` matches zero or more words. Checking a routing key
+against every binding one by one (e.g. with one regex per binding) costs
+O(bindings). Here the bindings are merged into a trie of words, so a lookup
+only walks the branches the routing key can follow: the literal word, `*`
+and `#` at each level. The cost grows with the depth of the key, not with
+the number of bindings.
+
+    matcher = TopicMatcher()
+    matcher.add("*.orange.*", "Q1")
+    matcher.add("lazy.#", "Q2")
+    matcher.match("lazy.orange.rabbit")   # {'Q1', 'Q2'}
+"""
+
+import re
+
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = {}
+        self.values = set()
+
+
+class TopicMatcher:
+    def __init__(self, cache_size=4096):
+        self.root = _Node()
+        self.bindings = 0
+        # routing key -> frozenset of values, cleared whenever bindings change
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def __len__(self):
+        return self.bindings
+
+    def add(self, binding_key, value=None):
+        """Bind `value` (the binding key itself by default) to `binding_key`."""
+        if value is None:
+            value = binding_key
+        node = self.root
+        for word in binding_key.split("."):
+            child = node.children.get(word)
+            if child is None:
+                child = node.children[word] = _Node()
+            node = child
+        if value not in node.values:
+            node.values.add(value)
+            self.bindings += 1
+            self._cache.clear()
+
+    def remove(self, binding_key, value=None):
+        if value is None:
+            value = binding_key
+        path = [self.root]
+        words = binding_key.split(".")
+        for word in words:
+            node = path[-1].children.get(word)
+            if node is None:
+                return False
+            path.append(node)
+        if value not in path[-1].values:
+            return False
+        path[-1].values.discard(value)
+        self.bindings -= 1
+        self._cache.clear()
+        # prune the branches that no longer lead to any binding
+        for word, node, parent in zip(reversed(words), reversed(path), reversed(path[:-1])):
+            if node.values or node.children:
+                break
+            del parent.children[word]
+        return True
+
+    def match(self, routing_key):
+        """Return the set of values whose binding key matches `routing_key`."""
+        cached = self._cache.get(routing_key)
+        if cached is not None:
+            return cached
+
+        words = routing_key.split(".")
+        end = len(words)
+        result = set()
+        # only '#' can reach the same (node, position) twice, e.g. "#.#"
+        seen = set()
+        stack = [(self.root, 0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, i = pop()
+            children = node.children
+            if children:
+                hash_node = children.get("#")
+                if hash_node is not None:
+                    # '#' swallows zero or more of the remaining words
+                    for j in range(i, end + 1):
+                        if (hash_node, j) not in seen:
+                            seen.add((hash_node, j))
+                            push((hash_node, j))
+                if i < end:
+                    child = children.get(words[i])
+                    if child is not None:
+                        push((child, i + 1))
+                    star = children.get("*")
+                    if star is not None:
+                        push((star, i + 1))
+            if i == end and node.values:
+                result |= node.values
+
+        result = frozenset(result)
+        if self.cache_size:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[routing_key] = result
+        return result
+
+    def matches(self, routing_key):
+        return bool(self.match(routing_key))
+
+
+def topic_regex(binding_key):
+    """
+        Compile a binding key to a regex for `"." + routing_key`, the linear
+        one-regex-per-binding approach the trie replaces.
+    """
+    pattern = ""
+    for word in binding_key.split("."):
+        if word == "#":
+            pattern += r"(?:\.[^.]*)*"
+        elif word == "*":
+            pattern += r"\.[^.]*"
+        else:
+            pattern += r"\." + re.escape(word)
+    return re.compile(pattern + r"\Z")